@@ -0,0 +1,105 @@
+"""
+Hot/cold storage: archival of completed tasks
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from .cache import invalidate_task_lists
+from .database import for_each_shard
+from .hierarchy import has_subtasks_completed_after, unlink_tasks, with_subtasks
+from .jobs import job_handler
+from .models import ArchivedTask, Task
+from .sync import record_tombstones
+
+# Archival policy
+ARCHIVE_AFTER_DAYS = int(os.getenv("TASK_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("TASK_ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("TASK_ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+# Columns shared by the hot and archive tables
+TASK_COLUMNS = [column.name for column in Task.__table__.columns]
+
+logger = logging.getLogger(__name__)
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move one batch of task trees completed before cutoff into the archive table.
+    
+    Only whole trees are archived: a top-level task goes together with all
+    of its subtasks once every one of them qualifies, so a hot task never
+    has archived subtasks (which would drop out of its progress, and be
+    left behind when it is deleted). batch_size counts top-level tasks.
+    Archived tasks leave the synced task list, so each gets a tombstone
+    that tells sync clients to drop it.
+    """
+    root_ids = db.scalars(
+        select(Task.id)
+        .where(Task.parent_id.is_(None), Task.completed_at < cutoff, ~has_subtasks_completed_after(cutoff))
+        .order_by(Task.completed_at)
+        .limit(batch_size)
+    ).all()
+    if not root_ids:
+        return 0
+    rows = db.execute(
+        select(Task.id, Task.assigned_user_id).where(Task.id.in_(with_subtasks(root_ids)))
+    ).all()
+    
+    by_user: Dict[int, List[int]] = {}
+    for row in rows:
+        by_user.setdefault(row.assigned_user_id, []).append(row.id)
+    # Users in a fixed order, as each tombstone batch takes that user's change lock
+    for user_id in sorted(by_user):
+        invalidate_task_lists(db, user_id)
+        record_tombstones(db, by_user[user_id], user_id)
+    move_to_archive(db, [row.id for row in rows])
+    db.commit()
+    return len(rows)
+
+def move_to_archive(db: Session, task_ids: List[int]):
+    """Copy tasks into the archive table and delete them from the hot table"""
+    unlink_tasks(db, task_ids)
+    db.execute(
+        insert(ArchivedTask).from_select(
+            TASK_COLUMNS,
+            select(*[Task.__table__.c[name] for name in TASK_COLUMNS]).where(Task.id.in_(task_ids))
+        )
+    )
+    db.execute(
+        delete(Task)
+        .where(Task.id.in_(task_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+def archive_completed_tasks(
+    db: Session,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    max_batches: Optional[int] = None
+) -> int:
+    """Archive tasks completed more than older_than_days ago, one small transaction per batch"""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(db, cutoff, batch_size)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+    if archived:
+        logger.info("Archived %s completed tasks", archived)
+    return archived
+
+@job_handler(
+    "archive_tasks",
+    concurrency=1,
+    interval=ARCHIVE_INTERVAL_SECONDS if ARCHIVE_AFTER_DAYS > 0 else None
+)
+def archive_tasks_job(db: Session, _payload: Dict[str, Any]):
+    """Recurring background job running one archival pass on every shard"""
+    if ARCHIVE_AFTER_DAYS > 0:
+        for _shard_id in for_each_shard(db):
+            archive_completed_tasks(db)
@@ -0,0 +1,188 @@
+"""
+Batched asynchronous change log for tasks
+"""
+import asyncio
+import enum
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from .database import SHARD_KEY, SessionLocal, shard_count, shares_connection
+from .models import TaskEvent, TaskEventAction
+from . import metrics
+
+# Durability mode: "buffered" writes events in background batches and may lose
+# the last flush interval on a crash; "sync" writes them in the same transaction
+# as the task change
+AUDIT_DURABILITY = os.getenv("AUDIT_DURABILITY", "buffered")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1"))
+AUDIT_MAX_BUFFERED = int(os.getenv("AUDIT_MAX_BUFFERED", "10000"))
+
+# Session.info key holding events staged until the transaction commits
+STAGED_EVENTS_KEY = "audit_staged_events"
+
+logger = logging.getLogger(__name__)
+
+def task_event(task_id: int, user_id: int, action: TaskEventAction, field: Optional[str] = None, value: Any = None) -> Dict[str, Any]:
+    """Build a change log row"""
+    if isinstance(value, enum.Enum):
+        value = value.value
+    return {
+        "task_id": task_id,
+        "user_id": user_id,
+        "action": action,
+        "field": field,
+        "value": None if value is None else str(value),
+        "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+    }
+
+def _group_by_shard(db: Session, events: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Split events by the shard holding each event's user"""
+    if shard_count(db) == 1:
+        return {0: events}
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for row in events:
+        groups.setdefault(db.shard_map.shard_for_user(row["user_id"]), []).append(row)
+    return groups
+
+class AuditLog:
+    """
+    In-memory buffer of task events flushed to the database in batches.
+    
+    Committing sessions only append to the buffer; the run() task writes
+    it out from a worker thread on its own pooled connection. Events
+    arriving while the buffer is at its cap are dropped and counted.
+    """
+    
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        durability: str = AUDIT_DURABILITY,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        max_buffered: int = AUDIT_MAX_BUFFERED
+    ):
+        self.session_factory = session_factory
+        self.durability = durability
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def record(self, db: Session, events: List[Dict[str, Any]]):
+        """
+        Record events for changes made in db's current transaction.
+        
+        In sync mode the rows are inserted in that transaction. Otherwise they
+        are staged on the session and only buffered once it commits, so
+        rolled-back changes leave no history.
+        """
+        if not events:
+            return
+        if self.durability == "sync":
+            db.execute(insert(TaskEvent), events)
+        else:
+            db.info.setdefault(STAGED_EVENTS_KEY, []).extend(events)
+    
+    def add(self, events: List[Dict[str, Any]]):
+        """Buffer committed events and wake the flusher once a batch is ready"""
+        with self._lock:
+            room = max(self.max_buffered - len(self._events), 0)
+            self._events.extend(events[:room])
+            dropped = len(events) - min(room, len(events))
+            self.dropped += dropped
+            pending = len(self._events)
+        if dropped:
+            logger.error("Task event buffer full, dropped %s events", dropped)
+        wakeup = self._wakeup
+        if pending >= self.batch_size and wakeup is not None:
+            self._loop.call_soon_threadsafe(wakeup.set)
+    
+    def flush(self) -> int:
+        """Write all buffered events in one batch; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+            db = self.session_factory()
+            written, failed = 0, []
+            try:
+                # One batch per shard, since each user's events live with their tasks
+                for shard_id, batch in _group_by_shard(db, events).items():
+                    db.info[SHARD_KEY] = shard_id
+                    try:
+                        db.execute(insert(TaskEvent), batch)
+                        db.commit()
+                        written += len(batch)
+                    except Exception as e:
+                        db.rollback()
+                        failed.extend(batch)
+                        logger.error("Failed to flush %s task events to shard %s: %s", len(batch), shard_id, e)
+            finally:
+                db.close()
+            if failed:
+                with self._lock:
+                    # Keep the batch for the next attempt unless that would exceed the cap
+                    room = max(self.max_buffered - len(self._events), 0)
+                    self._events[:0] = failed[-room:] if room else []
+                    dropped = len(failed) - min(room, len(failed))
+                    self.dropped += dropped
+                if dropped:
+                    logger.error("Dropped %s task events", dropped)
+            return written
+    
+    def clear(self):
+        """Discard buffered events"""
+        with self._lock:
+            self._events = []
+    
+    async def run(self, interval: float = AUDIT_FLUSH_INTERVAL_SECONDS):
+        """
+        Flush on an interval, or sooner once a full batch is buffered.
+        
+        Flushes run in a worker thread, so the session factory must hand
+        out pooled connections; one shared by every session is refused.
+        """
+        if shares_connection(self.session_factory):
+            raise RuntimeError("The task event flusher needs a pooled database; this one shares a single connection")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await asyncio.to_thread(self.flush)
+        finally:
+            self._wakeup = None
+            await asyncio.to_thread(self.flush)
+
+audit_log = AuditLog()
+
+@metrics.register
+def _audit_metrics():
+    """Task event buffer depth and overflow"""
+    yield ("taskflow_audit_events_buffered", "gauge", "Task events waiting to be written", len(audit_log._events))
+    yield ("taskflow_audit_events_dropped_total", "counter", "Task events dropped on a full buffer or failed flush", audit_log.dropped)
+
+@event.listens_for(Session, "after_commit")
+def _buffer_committed_events(session):
+    """Hand events staged on a session to the buffer once its transaction commits"""
+    events = session.info.pop(STAGED_EVENTS_KEY, None)
+    if events:
+        audit_log.add(events)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_events(session, _previous_transaction):
+    """Drop events staged for changes that were rolled back"""
+    session.info.pop(STAGED_EVENTS_KEY, None)
@@ -8,8 +8,10 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from .database import get_db
+from .database import get_db, route_to_user
 from .models import User
+from .queries import user_by_username
+from .sharding import find_user_id, is_sharded
 from .schemas import TokenData
 
 # Configuration
@@ -31,9 +33,15 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
-def get_user(db: Session, username: str) -> Optional[User]:
-    """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+def get_user(db: Session, username: str, user_id: Optional[int] = None) -> Optional[User]:
+    """Get user by username, routing db to the user's shard when sharded"""
+    if is_sharded(db):
+        if user_id is None:
+            user_id = find_user_id(db, username)
+        if user_id is None:
+            return None
+        route_to_user(db, user_id)
+    return user_by_username(db, username)
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """Authenticate user with username and password"""
@@ -67,11 +75,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(username=username, user_id=payload.get("uid"))
     except JWTError as exc:
         raise credentials_exception from exc
     
-    user = get_user(db, username=token_data.username or "")
+    user = get_user(db, username=token_data.username or "", user_id=token_data.user_id)
     if user is None:
         raise credentials_exception
     return user
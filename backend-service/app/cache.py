@@ -0,0 +1,208 @@
+"""
+Response cache for task list queries
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import metrics
+
+# Cache configuration
+TASK_CACHE_BACKEND = os.getenv("TASK_CACHE_BACKEND", "memory")
+TASK_CACHE_TTL_SECONDS = int(os.getenv("TASK_CACHE_TTL_SECONDS", "30"))
+TASK_CACHE_MAX_ENTRIES = int(os.getenv("TASK_CACHE_MAX_ENTRIES", "10000"))
+TASK_CACHE_MAX_BYTES = int(os.getenv("TASK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Session.info key holding users whose cached lists go stale on commit
+STAGED_INVALIDATIONS_KEY = "cache_staged_invalidations"
+
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL and entry and byte caps"""
+    
+    def __init__(self, max_entries: int = TASK_CACHE_MAX_ENTRIES, max_bytes: int = TASK_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        """Store value, evicting least recently used entries beyond the caps"""
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value)
+            self.size_bytes += len(key) + len(value)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+    
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size_bytes -= len(key) + len(value)
+
+class RedisCache:
+    """Shared cache backend on a Redis-compatible server"""
+    
+    def __init__(self, client, prefix: str = "taskflow:"):
+        self.client = client
+        self.prefix = prefix
+    
+    @classmethod
+    def from_url(cls, url: str = REDIS_URL) -> "RedisCache":
+        """Connect with the optional redis client library"""
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("TASK_CACHE_BACKEND=redis requires the 'redis' package") from exc
+        return cls(redis.Redis.from_url(url))
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+    
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.client.set(self.prefix + key, value, ex=ttl)
+    
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+    
+    def clear(self):
+        """Remove this cache's keys, leaving other data on the server"""
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+class TaskListCache:
+    """
+    Task list responses keyed by user, filters and page.
+    
+    Every key embeds a per-user generation token; a write replaces the token,
+    which makes all of that user's cached pages unreachable at once. Tokens are
+    random rather than counters so an evicted token can never resurrect stale
+    entries. Take the key before reading the database and store the page
+    under that same key, so a page computed while a write committed lands
+    under the superseded generation instead of the new one.
+    """
+    
+    def __init__(self, backend, ttl: int = TASK_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+    
+    def _generation(self, user_id: int) -> str:
+        key = f"gen:{user_id}"
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex.encode()
+            self.backend.set(key, generation)
+        return generation.decode()
+    
+    def key(self, user_id: int, params: Dict[str, Any]) -> str:
+        """Key of this user and query under the user's current generation"""
+        query = "&".join(f"{name}={params[name]}" for name in sorted(params) if params[name] is not None)
+        return f"tasks:{user_id}:{self._generation(user_id)}:{query}"
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached JSON body stored under key, if any"""
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+    
+    def set(self, key: str, body: bytes):
+        """Cache a JSON body under a key taken before it was computed"""
+        self.backend.set(key, body, self.ttl)
+    
+    def invalidate_user(self, user_id: int):
+        """Drop every cached list page for user_id"""
+        self.backend.set(f"gen:{user_id}", uuid.uuid4().hex.encode())
+    
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def hit_ratio(self) -> float:
+        """Fraction of lookups served from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+def _create_backend():
+    """Backend selected by TASK_CACHE_BACKEND, or None when caching is disabled"""
+    if TASK_CACHE_BACKEND == "redis":
+        return RedisCache.from_url()
+    if TASK_CACHE_BACKEND == "memory":
+        return MemoryCache()
+    return None
+
+_backend = _create_backend()
+task_list_cache: Optional[TaskListCache] = TaskListCache(_backend) if _backend is not None else None
+
+def invalidate_task_lists(db: Session, user_id: int):
+    """Invalidate user_id's cached task lists once db's transaction commits"""
+    db.info.setdefault(STAGED_INVALIDATIONS_KEY, set()).add(user_id)
+
+def has_pending_invalidation(db: Session, user_id: int) -> bool:
+    """Whether db has uncommitted writes that make user_id's cached lists stale"""
+    return user_id in db.info.get(STAGED_INVALIDATIONS_KEY, ())
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    """Invalidate cached lists of users whose tasks changed in the committed transaction"""
+    user_ids = session.info.pop(STAGED_INVALIDATIONS_KEY, None)
+    if user_ids and task_list_cache is not None:
+        for user_id in user_ids:
+            task_list_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back_invalidations(session, _previous_transaction):
+    """Keep cached lists when the writes were rolled back"""
+    session.info.pop(STAGED_INVALIDATIONS_KEY, None)
+
+@metrics.register
+def _cache_metrics():
+    """Hit ratio and size of the task list cache"""
+    if task_list_cache is None:
+        return
+    yield ("taskflow_task_cache_hits_total", "counter", "Task list cache hits", task_list_cache.hits)
+    yield ("taskflow_task_cache_misses_total", "counter", "Task list cache misses", task_list_cache.misses)
+    yield ("taskflow_task_cache_hit_ratio", "gauge", "Task list cache hit ratio", task_list_cache.hit_ratio)
+    if isinstance(task_list_cache.backend, MemoryCache):
+        yield ("taskflow_task_cache_entries", "gauge", "Task list cache entries", len(task_list_cache.backend))
+        yield ("taskflow_task_cache_bytes", "gauge", "Task list cache size in bytes", task_list_cache.backend.size_bytes)
@@ -2,26 +2,255 @@
 Database configuration and connection management
 """
 import os
-from sqlalchemy import create_engine
+import zlib
+from typing import Iterator, List, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
 # Database URL from environment variable
 DATABASE_URL = os.getenv(
-    "DATABASE_URL", 
+    "DATABASE_URL",
     "sqlite:///./taskflow.db"
 )
 
-# Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=StaticPool,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# Optional comma-separated shard URLs. The first shard also holds the global
+# tables (user directory, job queue); defaults to the single DATABASE_URL.
+DATABASE_SHARDS = [
+    url.strip() for url in os.getenv("DATABASE_SHARDS", "").split(",") if url.strip()
+] or [DATABASE_URL]
+
+# SQLite journal mode for file-backed databases: "wal" (default) gives reads a
+# pool of their own connections next to the single writer; "rollback" keeps
+# the classic journal (for filesystems without shared memory) and reads on
+# the writer. In-memory databases always share one connection (tests only).
+SQLITE_MODE = os.getenv("SQLITE_MODE", "wal")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_READER_POOL_SIZE = int(os.getenv("SQLITE_READER_POOL_SIZE", "40"))
+
+# Connection pool per server database (PostgreSQL)
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "20"))
+
+# Compiled SQL cache entries per engine; raise it if many filter/field
+# combinations are in use and the cache hit rate drops
+DATABASE_QUERY_CACHE_SIZE = int(os.getenv("DATABASE_QUERY_CACHE_SIZE", "1000"))
+
+# psycopg 3 prepares a statement server-side once it has run this many times
+# on a connection; "none" disables (needed behind a transaction-mode pooler)
+DATABASE_PREPARE_THRESHOLD = os.getenv("DATABASE_PREPARE_THRESHOLD", "5")
+
+# Session.info key selecting the shard a session talks to
+SHARD_KEY = "shard_id"
+
+# Session.info key set once a transaction has written, pinning it to the writer
+WRITER_KEY = "uses_writer"
+
+def is_memory_sqlite(url: str) -> bool:
+    """Whether url is an in-memory SQLite database"""
+    return url in ("sqlite://", "sqlite:///:memory:")
+
+def uses_sqlite_wal(url: str, mode: str = SQLITE_MODE) -> bool:
+    """Whether url gets the WAL reader/writer split (file-backed SQLite only)"""
+    return mode == "wal" and url.startswith("sqlite") and not is_memory_sqlite(url)
+
+def _configure_sqlite(engine: Engine, writer: bool, wal: bool = True):
+    """Apply the journal and locking pragmas to every new connection of engine"""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _record):
+        if writer:
+            # Let the begin hook below issue BEGIN itself
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+        cursor.execute(f"PRAGMA synchronous={'NORMAL' if wal else 'FULL'}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        if not writer:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    
+    if writer:
+        @event.listens_for(engine, "begin")
+        def _on_begin(conn):
+            # Take the write lock up front so a transaction never fails halfway
+            # through on a lock upgrade; waits up to busy_timeout for it. Route
+            # handlers and background workers run in threads, so the wait never
+            # holds up the event loop.
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def engine_url(url: str) -> str:
+    """url with its driver made explicit: plain postgresql:// URLs use psycopg 3"""
+    if url.startswith("postgresql://"):
+        return "postgresql+psycopg://" + url[len("postgresql://"):]
+    return url
+
+def _postgres_connect_args(url: str) -> dict:
+    """Server-side prepared statement settings for psycopg 3 connections"""
+    if not url.startswith("postgresql+psycopg:"):
+        return {}
+    threshold = DATABASE_PREPARE_THRESHOLD.lower()
+    return {"prepare_threshold": None if threshold == "none" else int(threshold)}
+
+def create_db_engine(url: str, mode: str = SQLITE_MODE) -> Engine:
+    """Create the SQLAlchemy engine for one database (the writer for SQLite files)"""
+    if is_memory_sqlite(url):
+        # One connection shared by every session; safe only single-threaded
+        return create_engine(
+            url,
+            poolclass=StaticPool,
+            query_cache_size=DATABASE_QUERY_CACHE_SIZE,
+            connect_args={"check_same_thread": False}
+        )
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            poolclass=QueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=max(SQLITE_BUSY_TIMEOUT_MS / 1000, 1),
+            query_cache_size=DATABASE_QUERY_CACHE_SIZE,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        _configure_sqlite(engine, writer=True, wal=uses_sqlite_wal(url, mode))
+        return engine
+    url = engine_url(url)
+    return create_engine(
+        url,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        query_cache_size=DATABASE_QUERY_CACHE_SIZE,
+        connect_args=_postgres_connect_args(url)
+    )
+
+def create_read_engine(url: str, writer: Engine, mode: str = SQLITE_MODE) -> Engine:
+    """Engine for reads: a pool of read-only connections in WAL mode, else the writer"""
+    if not uses_sqlite_wal(url, mode):
+        return writer
+    engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=SQLITE_READER_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=max(SQLITE_BUSY_TIMEOUT_MS / 1000, 1),
+        query_cache_size=DATABASE_QUERY_CACHE_SIZE,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    )
+    _configure_sqlite(engine, writer=False)
+    return engine
+
+def shares_connection(session_factory) -> bool:
+    """Whether sessions from session_factory all use one DBAPI connection"""
+    shard_map = session_factory.kw.get("shard_map")
+    binds = shard_map.engines if shard_map is not None else [session_factory.kw.get("bind")]
+    return any(isinstance(bind, Connection) or isinstance(bind.pool, StaticPool) for bind in binds if bind is not None)
+
+def is_busy_error(exc: BaseException) -> bool:
+    """
+    Whether exc is a timed-out wait for the database.
+    
+    Either SQLite gave up on a lock after busy_timeout, or no pooled
+    connection came free in time; with SQLite that is writes in this
+    process queueing for the single writer connection.
+    """
+    if isinstance(exc, PoolTimeoutError):
+        return True
+    return isinstance(exc, OperationalError) and "database is locked" in str(exc.orig)
+
+def shard_index(user_id: int, shard_count: int) -> int:
+    """Stable shard number for a user id"""
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+class ShardMap:
+    """Databases that users and their tasks are spread across by user id hash"""
+    
+    def __init__(self, urls: List[str], engines: Optional[List[Engine]] = None, readers: Optional[List[Engine]] = None):
+        self.urls = list(urls)
+        if engines is None:
+            engines = [create_db_engine(url) for url in self.urls]
+            readers = [create_read_engine(url, writer) for url, writer in zip(self.urls, engines)]
+        self.engines = engines
+        self.readers = readers if readers is not None else engines
+    
+    def __len__(self) -> int:
+        return len(self.engines)
+    
+    def shard_for_user(self, user_id: int) -> int:
+        """Home shard of a user"""
+        return shard_index(user_id, len(self.engines))
+
+class RoutingSession(Session):
+    """
+    Session routing each statement to a shard.
+    
+    Tables marked info={"global": True} always live on the first shard;
+    everything else goes to the shard selected with route_to_user(), or the
+    first shard until then. Where a shard has a separate reader engine,
+    reads use it until the transaction first writes; from then on
+    everything goes to the writer so the transaction sees its own changes.
+    """
+    
+    def __init__(self, shard_map: Optional[ShardMap] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.shard_map = shard_map
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.shard_map is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if mapper is not None and mapper.persist_selectable.info.get("global"):
+            shard_id = 0
+        else:
+            shard_id = self.info.get(SHARD_KEY, 0)
+        writer = self.shard_map.engines[shard_id]
+        reader = self.shard_map.readers[shard_id]
+        if reader is writer:
+            return writer
+        if self._flushing or getattr(clause, "is_dml", False) or self.info.get(WRITER_KEY):
+            self.info[WRITER_KEY] = True
+            return writer
+        return reader
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_writer(session, transaction):
+    """Let the next transaction read from the reader engines again"""
+    if transaction.parent is None:
+        session.info.pop(WRITER_KEY, None)
+
+def shard_count(db: Session) -> int:
+    """Number of shards behind a session (1 for plain sessions)"""
+    if isinstance(db, RoutingSession) and db.shard_map is not None:
+        return len(db.shard_map)
+    return 1
+
+def route_to_user(db: Session, user_id: int):
+    """Send db's subsequent per-user statements to user_id's shard"""
+    if shard_count(db) > 1:
+        db.info[SHARD_KEY] = db.shard_map.shard_for_user(user_id)
+
+def for_each_shard(db: Session) -> Iterator[int]:
+    """Point db at each shard in turn; commit before advancing"""
+    if shard_count(db) == 1:
+        yield 0
+        return
+    try:
+        for shard_id in range(shard_count(db)):
+            db.info[SHARD_KEY] = shard_id
+            yield shard_id
+    finally:
+        db.info.pop(SHARD_KEY, None)
+
+# Create the shard engines; a single-database deployment is a one-shard map
+shard_map = ShardMap(DATABASE_SHARDS)
+engine = shard_map.engines[0]
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, shard_map=shard_map, autocommit=False, autoflush=False)
 
 # Create Base class for models
 Base = declarative_base()
@@ -0,0 +1,131 @@
+"""
+Subtask hierarchy maintained in a closure table
+"""
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, delete, exists, func, insert, literal, or_, select, true, union_all
+from sqlalchemy.orm import Session, aliased
+from .models import Task, TaskClosure, TaskStatus
+
+def subtree_ids(task_id: int):
+    """SELECT of every descendant id of a task (not the task itself)"""
+    return select(TaskClosure.descendant_id).where(TaskClosure.ancestor_id == task_id)
+
+def _with_self(task_id: int, pairs, column: str):
+    """Closure rows of task_id at one end, plus the task itself at depth 0"""
+    return union_all(
+        select(literal(task_id).label(column), literal(0).label("depth")),
+        pairs,
+    ).subquery()
+
+def link_subtask(db: Session, task_id: int, parent_id: int):
+    """Record a new leaf task under parent_id and all of the parent's ancestors"""
+    ancestors = _with_self(
+        parent_id,
+        select(TaskClosure.ancestor_id, TaskClosure.depth).where(TaskClosure.descendant_id == parent_id),
+        "ancestor_id"
+    )
+    db.execute(insert(TaskClosure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(ancestors.c.ancestor_id, literal(task_id), ancestors.c.depth + 1)
+    ))
+
+def is_in_subtree(db: Session, task_id: int, candidate_id: int) -> bool:
+    """Whether candidate_id is task_id or one of its descendants"""
+    if task_id == candidate_id:
+        return True
+    return db.scalar(select(exists().where(
+        TaskClosure.ancestor_id == task_id,
+        TaskClosure.descendant_id == candidate_id
+    )))
+
+def move_subtree(db: Session, task_id: int, parent_id: Optional[int]):
+    """
+    Re-parent a task together with its whole subtree.
+    
+    The links from the task's old ancestors into the subtree are deleted
+    and the cross product of the new ancestors and the subtree inserted,
+    each in one statement; links inside the subtree are untouched.
+    """
+    subtree = _with_self(
+        task_id,
+        select(TaskClosure.descendant_id, TaskClosure.depth).where(TaskClosure.ancestor_id == task_id),
+        "descendant_id"
+    )
+    db.execute(
+        delete(TaskClosure)
+        .where(
+            TaskClosure.descendant_id.in_(select(subtree.c.descendant_id)),
+            TaskClosure.ancestor_id.in_(
+                select(TaskClosure.ancestor_id).where(TaskClosure.descendant_id == task_id)
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if parent_id is None:
+        return
+    
+    ancestors = _with_self(
+        parent_id,
+        select(TaskClosure.ancestor_id, TaskClosure.depth).where(TaskClosure.descendant_id == parent_id),
+        "ancestor_id"
+    )
+    db.execute(insert(TaskClosure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(
+            ancestors.c.ancestor_id,
+            subtree.c.descendant_id,
+            ancestors.c.depth + subtree.c.depth + 1
+        ).select_from(ancestors).join(subtree, true())
+    ))
+
+def unlink_tasks(db: Session, task_ids: List[int]):
+    """Drop every closure row pointing at removed tasks"""
+    db.execute(
+        delete(TaskClosure)
+        .where(TaskClosure.descendant_id.in_(task_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+def has_subtasks_completed_after(cutoff):
+    """EXISTS clause: the correlated Task has a subtask that is open or was completed after cutoff"""
+    subtask = aliased(Task)
+    return exists().where(
+        TaskClosure.ancestor_id == Task.id,
+        TaskClosure.descendant_id == subtask.id,
+        or_(subtask.completed_at.is_(None), subtask.completed_at >= cutoff)
+    )
+
+def with_subtasks(task_ids: List[int]):
+    """SELECT of the given task ids and the ids of all of their descendants"""
+    return union_all(
+        select(Task.id).where(Task.id.in_(task_ids)),
+        select(TaskClosure.descendant_id).where(TaskClosure.ancestor_id.in_(task_ids)),
+    )
+
+def subtree_progress(db: Session, task_id: int, include_descendants: bool = True) -> Dict[int, Tuple[int, int]]:
+    """
+    Subtask counts for a task, and optionally each of its descendants.
+    
+    Returns task id -> (subtasks, completed subtasks) for every task that
+    has subtasks, from one grouped query over the closure table.
+    """
+    scope = TaskClosure.ancestor_id == task_id
+    if include_descendants:
+        scope = or_(scope, TaskClosure.ancestor_id.in_(subtree_ids(task_id)))
+    rows = db.execute(
+        select(
+            TaskClosure.ancestor_id,
+            func.count(),
+            func.sum(case((Task.status == TaskStatus.COMPLETED, 1), else_=0))
+        )
+        .join(Task, Task.id == TaskClosure.descendant_id)
+        .where(scope)
+        .group_by(TaskClosure.ancestor_id)
+    ).all()
+    return {ancestor_id: (total, completed or 0) for ancestor_id, total, completed in rows}
+
+def progress_percent(task_status: TaskStatus, subtasks: int, completed: int) -> float:
+    """Completion percentage: share of completed subtasks, or the task's own status"""
+    if subtasks:
+        return round(100.0 * completed / subtasks, 1)
+    return 100.0 if task_status == TaskStatus.COMPLETED else 0.0
@@ -0,0 +1,238 @@
+"""
+In-process background job runner backed by a durable database queue
+"""
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from .database import SessionLocal, shares_connection
+from .models import Job, JobStatus
+
+# Runner configuration
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class JobHandler:
+    """Registered job handler and its scheduling limits"""
+    func: Callable[[Session, Dict[str, Any]], None]
+    concurrency: Optional[int] = None
+    interval: Optional[int] = None
+
+_handlers: Dict[str, JobHandler] = {}
+
+def _utcnow() -> datetime:
+    """Naive UTC timestamp, matching how DateTime columns are stored"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def job_handler(name: str, concurrency: Optional[int] = None, interval: Optional[int] = None):
+    """
+    Register a handler for jobs called name.
+    
+    Handlers are plain functions taking (db, payload); they run in a worker
+    thread with their own session and should commit their own work.
+    concurrency caps how many jobs of this name run at once; interval makes
+    the job recurring, re-enqueued that many seconds after each run.
+    """
+    def decorator(func):
+        _handlers[name] = JobHandler(func, concurrency, interval)
+        return func
+    return decorator
+
+def enqueue(
+    db: Session,
+    name: str,
+    payload: Optional[Dict[str, Any]] = None,
+    user_id: Optional[int] = None,
+    delay: float = 0,
+    max_attempts: int = JOB_MAX_ATTEMPTS
+) -> Job:
+    """Add a job to the queue; it is committed with the caller's transaction"""
+    job = Job(
+        name=name,
+        payload=payload or {},
+        user_id=user_id,
+        max_attempts=max_attempts,
+        run_after=_utcnow() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff before the next attempt"""
+    return min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+
+class JobRunner:
+    """Asyncio worker pool draining the jobs table"""
+    
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+    
+    def recover(self):
+        """Requeue jobs whose worker died mid-run and seed recurring jobs"""
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(Job)
+                .where(
+                    Job.status == JobStatus.RUNNING,
+                    Job.started_at < _utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+                )
+                .values(status=JobStatus.PENDING)
+            )
+            for name, handler in _handlers.items():
+                if handler.interval is None:
+                    continue
+                scheduled = db.scalar(
+                    select(Job.id).where(
+                        Job.name == name,
+                        Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING])
+                    ).limit(1)
+                )
+                if scheduled is None:
+                    enqueue(db, name)
+            db.commit()
+        finally:
+            db.close()
+    
+    def claim(self) -> Optional[Job]:
+        """Atomically mark the next due job as running and return it"""
+        with self._lock:
+            return self._claim()
+    
+    def _claim(self) -> Optional[Job]:
+        """Claim the next due job whose handler is below its concurrency limit"""
+        saturated = [
+            name for name, handler in _handlers.items()
+            if handler.concurrency is not None and self._running.get(name, 0) >= handler.concurrency
+        ]
+        now = _utcnow()
+        next_job = (
+            select(Job.id)
+            .where(Job.status == JobStatus.PENDING, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if saturated:
+            next_job = next_job.where(Job.name.not_in(saturated))
+        
+        db = self.session_factory()
+        try:
+            job = db.scalars(
+                update(Job)
+                .where(Job.id == next_job.scalar_subquery(), Job.status == JobStatus.PENDING)
+                .values(status=JobStatus.RUNNING, attempts=Job.attempts + 1, started_at=now)
+                .returning(Job)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if job:
+                db.expunge(job)
+            db.commit()
+            if job:
+                self._running[job.name] = self._running.get(job.name, 0) + 1
+            return job
+        finally:
+            db.close()
+    
+    def execute(self, job: Job):
+        """Run a claimed job and record success, a scheduled retry or failure"""
+        handler = _handlers.get(job.name)
+        db = self.session_factory()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job {job.name!r}")
+            handler.func(db, job.payload or {})
+            db.commit()
+            self._finish(db, job, JobStatus.SUCCEEDED)
+        except Exception as e:
+            db.rollback()
+            if job.attempts < job.max_attempts:
+                logger.warning("Job %s (%s) failed, retrying: %s", job.id, job.name, e)
+                self._finish(db, job, JobStatus.PENDING, str(e), retry_delay(job.attempts))
+            else:
+                logger.error("Job %s (%s) failed permanently: %s", job.id, job.name, e)
+                self._finish(db, job, JobStatus.FAILED, str(e))
+        finally:
+            db.close()
+            with self._lock:
+                self._running[job.name] -= 1
+    
+    def _finish(self, db: Session, job: Job, job_status: JobStatus, error: Optional[str] = None, delay: float = 0):
+        """Persist the outcome of a run and reschedule recurring jobs"""
+        values = {"status": job_status, "last_error": error}
+        if job_status == JobStatus.PENDING:
+            values["run_after"] = _utcnow() + timedelta(seconds=delay)
+        db.execute(update(Job).where(Job.id == job.id).values(**values))
+        handler = _handlers.get(job.name)
+        if handler and handler.interval is not None and job_status != JobStatus.PENDING:
+            enqueue(db, job.name, job.payload, job.user_id, delay=handler.interval, max_attempts=job.max_attempts)
+        db.commit()
+    
+    def run_pending(self) -> int:
+        """Synchronously drain all due jobs; returns how many ran"""
+        ran = 0
+        while (job := self.claim()) is not None:
+            self.execute(job)
+            ran += 1
+        return ran
+    
+    async def _worker(self):
+        """Claim and execute jobs until the runner stops"""
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(self.claim)
+                if job is not None:
+                    await asyncio.to_thread(self.execute, job)
+                    continue
+            except Exception as e:
+                logger.error("Job worker error: %s", e)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def start(self):
+        """
+        Recover interrupted work and start the worker pool.
+        
+        Workers claim and run jobs in threads, each on its own pooled
+        connection; a session factory whose sessions share one connection
+        (in-memory SQLite) is refused, as concurrent use would corrupt it.
+        """
+        if shares_connection(self.session_factory):
+            raise RuntimeError("Job workers need a pooled database; this one shares a single connection")
+        await asyncio.to_thread(self.recover)
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Started %s background job workers", self.workers)
+    
+    async def stop(self):
+        """Let in-flight jobs finish, then stop the workers"""
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
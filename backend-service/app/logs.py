@@ -0,0 +1,237 @@
+"""
+Non-blocking structured logging: records are queued by request threads and
+formatted and written as JSON lines by a background listener thread
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+from . import metrics
+
+# Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+
+# Incoming request ids are reused only if they look like ids
+REQUEST_ID_HEADER = "x-request-id"
+# ASGI scope key carrying the request id to code that runs outside the
+# request context, such as the app's outermost exception handler
+REQUEST_ID_SCOPE_KEY = "taskflow.request_id"
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+# uvicorn configures these with synchronous stream handlers of their own
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+ACCESS_LOGGER = "uvicorn.access"
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RequestContext:
+    """Per-request logging state"""
+    request_id: str
+    # Whether this request's info and debug records are kept
+    sampled: bool = True
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+def current_request_id() -> Optional[str]:
+    """Id of the request being handled, if any"""
+    context = request_context.get()
+    return context.request_id if context else None
+
+def scope_request_id(scope) -> Optional[str]:
+    """Id assigned to the request of an ASGI scope, if any"""
+    return scope.get(REQUEST_ID_SCOPE_KEY)
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamp records with the current request id and apply info-log sampling.
+    
+    The sampling decision is made once per request, so a request's
+    records are either all kept or all dropped; warnings and errors, and
+    records logged outside a request, are always kept.
+    """
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Attach request_id; drop unsampled below-warning records"""
+        context = request_context.get()
+        if context is None:
+            return True
+        record.request_id = context.request_id
+        return context.sampled or record.levelno >= logging.WARNING
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Resolve the message and traceback on the calling thread.
+        
+        Unlike the default, the record is not pre-formatted, so the
+        listener's formatter still sees the message and extras separately.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        """Queue a record without waiting"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including request id and extra fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        """Render a record as a JSON line"""
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    log_format: str = LOG_FORMAT,
+    queue_size: int = LOG_QUEUE_SIZE
+):
+    """
+    Route all logging through a bounded queue to a stdout listener thread.
+    
+    Replaces the root logger's handlers and uvicorn's own stream handlers,
+    so server messages go through the queue too; uvicorn's access log is
+    dropped, as RequestLoggingMiddleware logs every request. Calling it
+    again is a no-op.
+    """
+    global _queue_handler, _listener
+    if _queue_handler is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+            defaults={"request_id": "-"}
+        ))
+    
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _queue_handler.addFilter(RequestContextFilter())
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    route_server_logs()
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def route_server_logs():
+    """Hand uvicorn's messages to the root logger and silence its access log"""
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        for handler in list(server_logger.handlers):
+            server_logger.removeHandler(handler)
+        server_logger.propagate = name != ACCESS_LOGGER
+    logging.getLogger(ACCESS_LOGGER).addHandler(logging.NullHandler())
+
+def shutdown_logging():
+    """Stop the listener after it has written out the queued records"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+@metrics.register
+def _logging_metrics():
+    """Log queue depth and overflow"""
+    if _queue_handler is None:
+        return
+    yield ("taskflow_log_records_dropped_total", "counter", "Log records dropped on a full queue", _queue_handler.dropped)
+    yield ("taskflow_log_queue_depth", "gauge", "Log records waiting to be written", _queue_handler.queue.qsize())
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware assigning each request an id and logging its timing.
+    
+    The id is taken from an incoming X-Request-ID header when it is
+    well-formed, made available to every log record of the request, and
+    echoed back in the response.
+    """
+    
+    def __init__(self, app, sample_rate: float = LOG_INFO_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+    
+    async def __call__(self, scope, receive, send):
+        """Handle one ASGI connection"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        scope[REQUEST_ID_SCOPE_KEY] = request_id
+        token = request_context.set(RequestContext(request_id, random.random() < self.sample_rate))
+        status_code = 500
+        
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+        
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            logger.info(
+                "%s %s %s %.2fms", scope["method"], scope["path"], status_code, duration_ms,
+                extra={"method": scope["method"], "path": scope["path"], "status_code": status_code, "duration_ms": duration_ms}
+            )
+            request_context.reset(token)
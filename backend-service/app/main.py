@@ -2,30 +2,65 @@
 TaskFlow Backend Service
 FastAPI application entry point
 """
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from .database import engine, Base
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .database import SessionLocal, shard_map, Base, is_busy_error, shares_connection
+from .migrations import upgrade_schema
 from .routes import router
+from .jobs import JOBS_ENABLED, JobRunner
+from .audit import audit_log
+from .logs import RequestLoggingMiddleware, configure_logging, scope_request_id
+from .profiling import ProfilingMiddleware, loop_monitor
+from . import metrics
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: records are written by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Create database tables
+# Create database tables and add columns missing from older databases
 try:
-    Base.metadata.create_all(bind=engine)
+    for shard_engine in shard_map.engines:
+        Base.metadata.create_all(bind=shard_engine)
+        upgrade_schema(shard_engine)
     logger.info("Database tables created successfully")
 except Exception as e:
     logger.error("Failed to create database tables: %s", e)
     raise
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Start and stop background workers"""
+    runner = JobRunner() if JOBS_ENABLED else None
+    if shares_connection(SessionLocal):
+        # Background threads must not touch the single in-memory connection
+        logger.warning("In-memory database: job workers disabled and task history written synchronously")
+        runner = None
+        audit_log.durability = "sync"
+    if loop_monitor:
+        await loop_monitor.start()
+    if runner:
+        await runner.start()
+    audit_writer = asyncio.create_task(audit_log.run()) if audit_log.durability != "sync" else None
+    yield
+    if audit_writer:
+        audit_writer.cancel()
+        with suppress(asyncio.CancelledError):
+            await audit_writer
+    if runner:
+        await runner.stop()
+    if loop_monitor:
+        await loop_monitor.stop()
+
 # Create FastAPI app
 app = FastAPI(
     title="TaskFlow API",
     description="Task Management Microservice",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -43,6 +78,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profile requests selected by X-Profile or sampling (inside the request id)
+app.add_middleware(ProfilingMiddleware)
+
+# Request ids and timings for every log line of a request
+app.add_middleware(RequestLoggingMiddleware)
+
 # Include API routes
 app.include_router(router, prefix="/api")
 
@@ -57,10 +98,25 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics endpoint"""
+    return metrics.render()
+
 # Global exception handler
 @app.exception_handler(Exception)
-async def global_exception_handler(_request, exc):
-    logger.error("Unhandled exception: %s", exc)
+async def global_exception_handler(request, exc):
+    # Runs outside RequestLoggingMiddleware, so the request id comes from the scope
+    request_id = scope_request_id(request.scope)
+    log_extra = {"request_id": request_id} if request_id else {}
+    if is_busy_error(exc):
+        logger.warning("Database busy: %s", exc, extra=log_extra)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database busy, retry shortly"},
+            headers={"Retry-After": "1"}
+        )
+    logger.error("Unhandled exception: %s", exc, extra=log_extra)
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
@@ -0,0 +1,23 @@
+"""
+Minimal Prometheus text-format metrics registry
+"""
+from typing import Callable, Iterable, List, Tuple
+
+# A collector yields (name, type, help, value) samples when scraped
+Sample = Tuple[str, str, str, float]
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+def register(collector: Callable[[], Iterable[Sample]]):
+    """Register a collector function; usable as a decorator"""
+    _collectors.append(collector)
+    return collector
+
+def render() -> str:
+    """Render all collected samples in the Prometheus exposition format"""
+    lines = []
+    for collector in _collectors:
+        for name, metric_type, help_text, value in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,80 @@
+"""
+In-place schema upgrades for databases created by earlier releases
+
+Startup creates missing tables with Base.metadata.create_all, which never
+alters a table that already exists. Every column added to an existing
+table since is listed here with the statements that bring old rows up to
+date; upgrade_schema adds the missing ones, so it is safe on every start.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from sqlalchemy import Column, func, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+from .models import Task, TaskStatus
+from .sync import advance_change_seq
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class ColumnUpgrade:
+    """A column added to an existing table, and how to fill it for old rows"""
+    column: Column
+    backfill: Optional[Callable[[Session], None]] = None
+
+def _stamp_completed_tasks(db: Session):
+    """Give tasks completed before completed_at existed a completion time, so they can be archived"""
+    db.execute(
+        update(Task)
+        .where(Task.status == TaskStatus.COMPLETED, Task.completed_at.is_(None))
+        .values(
+            completed_at=func.coalesce(Task.updated_at, Task.created_at, func.now()),
+            updated_at=Task.updated_at
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def _number_existing_changes(db: Session):
+    """Give every existing task a distinct change sequence value, so a first sync returns it"""
+    db.execute(
+        update(Task)
+        .values(change_seq=Task.id, updated_at=Task.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    advance_change_seq(db, db.scalar(select(func.max(Task.id))) or 0)
+
+# In the order the columns were added. Backfills keep updated_at as it was,
+# which Task's onupdate would otherwise stamp.
+UPGRADES: List[ColumnUpgrade] = [
+    ColumnUpgrade(Task.__table__.c.version),
+    ColumnUpgrade(Task.__table__.c.completed_at, _stamp_completed_tasks),
+    ColumnUpgrade(Task.__table__.c.change_seq, _number_existing_changes),
+    ColumnUpgrade(Task.__table__.c.parent_id),
+]
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """Add missing columns, their indexes and backfills; returns the columns added"""
+    added = []
+    with Session(engine) as db:
+        existing = {}
+        for upgrade in UPGRADES:
+            table = upgrade.column.table
+            if table.name not in existing:
+                existing[table.name] = {column["name"] for column in inspect(db.connection()).get_columns(table.name)}
+            if upgrade.column.name in existing[table.name]:
+                continue
+            column_ddl = CreateColumn(upgrade.column).compile(dialect=engine.dialect)
+            db.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+            for index in table.indexes:
+                if upgrade.column.name in index.columns:
+                    index.create(db.connection(), checkfirst=True)
+            if upgrade.backfill:
+                upgrade.backfill(db)
+            existing[table.name].add(upgrade.column.name)
+            added.append(f"{table.name}.{upgrade.column.name}")
+        db.commit()
+    if added:
+        logger.info("Upgraded schema: added %s", ", ".join(added))
+    return added
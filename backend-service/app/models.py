@@ -1,12 +1,16 @@
 """
 SQLAlchemy models for TaskFlow
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Enum, Index, JSON, Sequence, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 from .database import Base
 
+# Global, monotonic change sequence for delta sync (emulated by SyncState where
+# the database has no sequences)
+task_change_seq = Sequence("task_change_seq", metadata=Base.metadata)
+
 class TaskStatus(str, enum.Enum):
     """Task status enumeration"""
     PENDING = "pending"
@@ -19,6 +23,19 @@ class TaskPriority(str, enum.Enum):
     MEDIUM = "medium"
     HIGH = "high"
 
+class JobStatus(str, enum.Enum):
+    """Background job status enumeration"""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class TaskEventAction(str, enum.Enum):
+    """Task change log action enumeration"""
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
 class User(Base):
     """User model"""
     __tablename__ = "users"
@@ -36,6 +53,11 @@ class User(Base):
 class Task(Base):
     """Task model"""
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_assigned_user_id_change_seq", "assigned_user_id", "change_seq"),
+        # Never reuse ids of deleted tasks, which tombstones still refer to
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -43,8 +65,139 @@ class Task(Base):
     status = Column(Enum(TaskStatus), default=TaskStatus.PENDING, nullable=False)
     priority = Column(Enum(TaskPriority), default=TaskPriority.MEDIUM, nullable=False)
     assigned_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Parent in the subtask hierarchy; task_closure holds the full ancestry
+    parent_id = Column(Integer, index=True)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now())
+    completed_at = Column(DateTime, index=True)
+    change_seq = Column(BigInteger, server_default="0", nullable=False)
     
     # Relationship to user
     assigned_user = relationship("User", back_populates="tasks")
+
+class ArchivedTask(Base):
+    """Completed task moved out of the hot tasks table"""
+    __tablename__ = "archived_tasks"
+    
+    id = Column(Integer, primary_key=True)
+    title = Column(String(200), nullable=False)
+    description = Column(Text)
+    status = Column(Enum(TaskStatus), nullable=False)
+    priority = Column(Enum(TaskPriority), nullable=False)
+    assigned_user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    parent_id = Column(Integer)
+    version = Column(Integer, nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    change_seq = Column(BigInteger, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+class TaskClosure(Base):
+    """
+    Closure table of the subtask hierarchy: one row per ancestor/descendant
+    pair (depth 1 for a direct parent), so whole subtrees and ancestor
+    chains are single indexed lookups. Tasks without a parent or subtasks
+    have no rows.
+    """
+    __tablename__ = "task_closure"
+    __table_args__ = (
+        Index("ix_task_closure_descendant_id_depth", "descendant_id", "depth"),
+    )
+    
+    ancestor_id = Column(Integer, primary_key=True)
+    descendant_id = Column(Integer, primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+class Tag(Base):
+    """Label owned by a user, with a running count of the tasks carrying it"""
+    __tablename__ = "tags"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_tags_user_id_name"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(50), nullable=False)
+    # Maintained on every tag/untag so per-user counts never scan task_tags
+    task_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+class TaskTag(Base):
+    """Task/tag link, indexed from both sides"""
+    __tablename__ = "task_tags"
+    __table_args__ = (
+        Index("ix_task_tags_tag_id_task_id", "tag_id", "task_id"),
+    )
+    
+    # No foreign key to tasks: archived tasks keep their ids and their tags
+    task_id = Column(Integer, primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+
+class Job(Base):
+    """Durable background job queue entry"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        # The queue lives on the first shard only
+        {"info": {"global": True}},
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    payload = Column(JSON)
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    last_error = Column(Text)
+    # No foreign key: the user may live on another shard
+    user_id = Column(Integer, index=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, onupdate=func.now())
+
+class TaskEvent(Base):
+    """Change history entry for a task field"""
+    __tablename__ = "task_events"
+    __table_args__ = (
+        Index("ix_task_events_task_id_id", "task_id", "id"),
+    )
+    
+    # No foreign key to tasks so that history outlives deleted tasks
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    action = Column(Enum(TaskEventAction), nullable=False)
+    field = Column(String(50))
+    value = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+
+class TaskTombstone(Base):
+    """Marker left by a deleted task so clients can sync the deletion"""
+    __tablename__ = "task_tombstones"
+    __table_args__ = (
+        Index("ix_task_tombstones_user_id_change_seq", "user_id", "change_seq"),
+    )
+    
+    task_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, server_default=func.now(), index=True)
+
+class SyncState(Base):
+    """Named counters and watermarks for delta sync"""
+    __tablename__ = "sync_state"
+    
+    key = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False)
+
+class UserDirectory(Base):
+    """Global username/email registry allocating user ids when sharded"""
+    __tablename__ = "user_directory"
+    __table_args__ = {"info": {"global": True}}
+    
+    id = Column(Integer, primary_key=True)
+    username = Column(String(50), unique=True, nullable=False)
+    email = Column(String(100), unique=True, nullable=False)
@@ -0,0 +1,301 @@
+"""
+Event-loop lag monitoring and sampling request profiler
+
+A heartbeat coroutine measures how late the event loop wakes up; a watchdog
+thread logs the loop thread's stack whenever the heartbeat stalls, which
+points at the blocking call. Selected requests are profiled by sampling the
+loop thread and the thread pool running route handlers, written as folded
+stacks ("a;b;c count" lines) that flamegraph.pl, inferno and speedscope
+read directly.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Optional
+from . import metrics
+from .logs import current_request_id
+
+# Event-loop monitor configuration
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL_MS = int(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+
+# Request profiler configuration
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+# When set, X-Profile must carry this value instead of "1"
+PROFILE_HEADER_TOKEN = os.getenv("PROFILE_HEADER_TOKEN", "")
+PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+
+# Sync route handlers and dependencies run on the thread pool under this name
+HANDLER_THREAD_NAME = "AnyIO worker thread"
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+logger = logging.getLogger(__name__)
+
+def _frame_label(frame) -> str:
+    """Flamegraph frame name: function and where it is defined"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold_stack(frame) -> str:
+    """A thread's stack as one semicolon-joined line, outermost frame first"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+def _waiting_for_work(frame) -> bool:
+    """Whether a pool thread is parked on its work queue rather than running a call"""
+    while frame is not None:
+        if frame.f_code.co_name == "get" and frame.f_code.co_filename == queue.__file__:
+            return True
+        frame = frame.f_back
+    return False
+
+class LoopMonitor:
+    """
+    Measure event-loop lag and report what blocks the loop.
+    
+    The heartbeat sleeps for interval and records how much later than
+    that it resumed. If no heartbeat lands for threshold, the watchdog
+    thread logs the loop thread's current stack, once per stall.
+    """
+    
+    def __init__(self, interval_ms: int = LOOP_LAG_INTERVAL_MS, threshold_ms: int = LOOP_BLOCK_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocked = 0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+    
+    async def start(self):
+        """Start the heartbeat on the running loop and the watchdog thread"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+    
+    async def stop(self):
+        """Stop the heartbeat and the watchdog"""
+        self._stopping.set()
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._heartbeat
+        if self._watchdog:
+            self._watchdog.join()
+    
+    async def _beat(self):
+        """Record how late each wake-up is"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(now - started - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            self._last_beat = now
+    
+    def _watch(self):
+        """Log the loop thread's stack when the heartbeat stalls"""
+        reported_beat = None
+        while not self._stopping.wait(self.threshold / 4):
+            last_beat = self._last_beat
+            stalled = time.monotonic() - last_beat - self.interval
+            if stalled < self.threshold or last_beat == reported_beat:
+                continue
+            reported_beat = last_beat
+            self.blocked += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(loop thread not found)"
+            logger.warning(
+                "Event loop blocked for %.0fms:\n%s", stalled * 1000, stack,
+                extra={"blocked_ms": round(stalled * 1000)}
+            )
+
+loop_monitor = LoopMonitor() if LOOP_MONITOR_ENABLED else None
+
+# Profiles written so far; one sampler runs at a time
+_profiles_written = 0
+
+class StackSampler:
+    """
+    Background thread counting folded stacks at a fixed interval.
+    
+    Samples thread_id and, with include_handlers, every handler pool
+    thread that is running a call at that moment.
+    """
+    
+    def __init__(self, thread_id: int, interval_ms: int = PROFILE_INTERVAL_MS, include_handlers: bool = False):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.include_handlers = include_handlers
+        self.samples: Counter = Counter()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+    
+    def start(self):
+        """Begin sampling"""
+        self._thread.start()
+    
+    def stop(self):
+        """Ask the sampler to finish; does not wait for it"""
+        self._stopping.set()
+    
+    def _stacks(self):
+        """Current frames of the sampled threads"""
+        frames = sys._current_frames()
+        if self.thread_id in frames:
+            yield frames[self.thread_id]
+        if not self.include_handlers:
+            return
+        for thread in threading.enumerate():
+            frame = frames.get(thread.ident)
+            if thread.name == HANDLER_THREAD_NAME and frame is not None and not _waiting_for_work(frame):
+                yield frame
+    
+    def _run(self):
+        """Sample until stopped, then run on_finish"""
+        while True:
+            for frame in self._stacks():
+                self.samples[fold_stack(frame)] += 1
+            if self._stopping.wait(self.interval):
+                break
+        self.on_finish()
+    
+    def on_finish(self):
+        """Hook called on the sampler thread once sampling has stopped"""
+
+def write_folded(path: str, samples: Counter, max_files: int = PROFILE_MAX_FILES):
+    """Write samples in folded-stack format, keeping it and at most max_files - 1 older profiles"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as output:
+        for stack, count in samples.most_common():
+            output.write(f"{stack} {count}\n")
+    # Names start with a timestamp, which breaks ties between equal mtimes
+    older = sorted(
+        (
+            entry for entry in os.scandir(directory)
+            if entry.name.endswith(".folded") and entry.name != os.path.basename(path)
+        ),
+        key=lambda entry: (entry.stat().st_mtime, entry.name)
+    )
+    for entry in older[:max(len(older) - max(max_files - 1, 0), 0)]:
+        with suppress(FileNotFoundError):
+            os.remove(entry.path)
+
+class _RequestSampler(StackSampler):
+    """Stack sampler writing its profile to a file when done"""
+    
+    def __init__(self, thread_id: int, path: str, interval_ms: int, max_files: int, done: threading.Lock):
+        super().__init__(thread_id, interval_ms, include_handlers=True)
+        self.path = path
+        self.max_files = max_files
+        self.done = done
+    
+    def on_finish(self):
+        """Write the profile off the event loop and free the profiler slot"""
+        global _profiles_written
+        try:
+            write_folded(self.path, self.samples, self.max_files)
+            _profiles_written += 1
+        except OSError as e:
+            logger.error("Failed to write profile %s: %s", self.path, e)
+        finally:
+            self.done.release()
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling sampled or header-selected requests.
+    
+    A request is profiled when it falls in the sample rate or, if header
+    profiling is enabled, sends X-Profile: 1 (or the configured token).
+    Only one request is profiled at a time; the sampler follows the
+    event-loop thread and the busy handler threads while the request is in
+    flight, so concurrent requests share the profile. The file name is
+    returned in the X-Profile-File response header.
+    """
+    
+    def __init__(
+        self,
+        app,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        header_enabled: bool = PROFILE_HEADER_ENABLED,
+        header_token: str = PROFILE_HEADER_TOKEN,
+        directory: str = PROFILE_DIR,
+        interval_ms: int = PROFILE_INTERVAL_MS,
+        max_files: int = PROFILE_MAX_FILES
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header_enabled = header_enabled
+        self.header_token = (header_token or "1").encode()
+        self.directory = directory
+        self.interval_ms = interval_ms
+        self.max_files = max_files
+        self._busy = threading.Lock()
+    
+    def _wants_profile(self, scope) -> bool:
+        """Whether the request asked for, or was sampled for, profiling"""
+        if self.header_enabled:
+            requested = dict(scope["headers"]).get(PROFILE_HEADER)
+            if requested is not None and hmac.compare_digest(requested, self.header_token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+    
+    async def __call__(self, scope, receive, send):
+        """Handle one ASGI connection"""
+        if scope["type"] != "http" or not self._wants_profile(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        filename = f"{stamp}-{current_request_id() or uuid.uuid4().hex}.folded"
+        sampler = _RequestSampler(
+            threading.get_ident(), os.path.join(self.directory, filename),
+            self.interval_ms, self.max_files, self._busy
+        )
+        
+        async def send_with_profile_file(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_FILE_HEADER, filename.encode())]
+            await send(message)
+        
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_file)
+        finally:
+            sampler.stop()
+
+@metrics.register
+def _profiling_metrics():
+    """Event-loop lag and profiles written"""
+    if loop_monitor is not None:
+        yield ("taskflow_event_loop_lag_seconds", "gauge", "Latest event-loop wake-up delay", loop_monitor.lag)
+        yield ("taskflow_event_loop_lag_max_seconds", "gauge", "Largest event-loop wake-up delay seen", loop_monitor.max_lag)
+        yield ("taskflow_event_loop_blocked_total", "counter", "Event-loop stalls over the threshold", loop_monitor.blocked)
+    yield ("taskflow_profiles_written_total", "counter", "Request profiles written", _profiles_written)
@@ -0,0 +1,54 @@
+"""
+Hot-path statements, built once and executed with bound parameters
+
+Building a SQLAlchemy statement per request costs more CPU than running it:
+the expression has to be constructed and its cache key derived before the
+compiled SQL can be reused. These statements are constructed at import
+time, so a request only supplies parameter values.
+"""
+from typing import List, Optional
+from sqlalchemy import Row, bindparam, delete, or_, select
+from sqlalchemy.orm import Session
+from .models import Task, TaskClosure, User
+
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
+USER_TASK = select(Task).where(
+    Task.id == bindparam("task_id"),
+    Task.assigned_user_id == bindparam("user_id")
+)
+
+USER_TASK_EXISTS = select(Task.id).where(
+    Task.id == bindparam("task_id"),
+    Task.assigned_user_id == bindparam("user_id")
+)
+
+# A task with all of its subtasks, scoped to the owner
+DELETE_USER_TASK_TREE = (
+    delete(Task)
+    .where(
+        or_(
+            Task.id == bindparam("task_id"),
+            Task.id.in_(select(TaskClosure.descendant_id).where(TaskClosure.ancestor_id == bindparam("task_id")))
+        ),
+        Task.assigned_user_id == bindparam("user_id")
+    )
+    .returning(Task.id, Task.parent_id)
+    .execution_options(synchronize_session=False)
+)
+
+def user_by_username(db: Session, username: str) -> Optional[User]:
+    """Look up a user by username"""
+    return db.scalars(USER_BY_USERNAME, {"username": username}).first()
+
+def user_task(db: Session, task_id: int, user_id: int) -> Optional[Task]:
+    """Load a task if it belongs to the user"""
+    return db.scalars(USER_TASK, {"task_id": task_id, "user_id": user_id}).first()
+
+def user_task_exists(db: Session, task_id: int, user_id: int) -> bool:
+    """Whether the user owns a task, without loading it"""
+    return db.scalar(USER_TASK_EXISTS, {"task_id": task_id, "user_id": user_id}) is not None
+
+def delete_user_task_tree(db: Session, task_id: int, user_id: int) -> List[Row]:
+    """Delete a task and its subtasks; returns (id, parent_id) of each deleted task"""
+    return db.execute(DELETE_USER_TASK_TREE, {"task_id": task_id, "user_id": user_id}).all()
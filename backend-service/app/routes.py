@@ -1,24 +1,66 @@
 """
 API routes for TaskFlow
+
+Handlers are plain functions rather than coroutines: FastAPI runs them on
+its thread pool, so blocking database calls, including waits for the
+SQLite writer, never hold up the event loop.
 """
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import func, insert, select, union_all, update
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from typing import List, Literal, Optional
 
-from .database import get_db
-from .models import Task, User, TaskStatus, TaskPriority
+from .database import get_db, is_busy_error, route_to_user
+from .models import (
+    ArchivedTask, Job, Tag, Task, TaskClosure, TaskEvent, TaskEventAction, TaskTombstone,
+    User, UserDirectory, TaskStatus, TaskPriority
+)
 from .schemas import (
     TaskCreate, TaskUpdate, Task as TaskSchema, 
     UserCreate, UserLogin, Token, User as UserSchema,
-    TaskListResponse
+    TaskListResponse, Job as JobSchema, TaskEvent as TaskEventSchema,
+    TaskHistoryResponse, TaskChangesResponse, TaskListParams, TaskDetailParams, TaskRef, TaskUpdateOperation,
+    TaskMove, TaskNode, TaskSubtreeResponse, TaskAncestorsResponse, TaskProgress,
+    Tag as TagSchema, TagListResponse, TaskTags, TagOperation, TagOperationResult,
+    BatchOperation, BatchRequest, BatchResult, BatchResponse
 )
 from .auth import authenticate_user, create_access_token, get_current_user, get_password_hash
+from .archive import TASK_COLUMNS
+from .audit import audit_log, task_event
+from .cache import has_pending_invalidation, invalidate_task_lists, task_list_cache
+from .hierarchy import (
+    is_in_subtree, link_subtask, move_subtree, progress_percent,
+    subtree_progress, unlink_tasks
+)
+from .queries import delete_user_task_tree, user_task, user_task_exists
+from .sharding import is_sharded, release_user_id, reserve_user_id
+from .tags import (
+    MAX_TAG_LENGTH, drop_task_tags, normalize_tag_names, tag_tasks, tagged_task_ids,
+    task_tag_names, untag_tasks
+)
+from .sync import next_change_seq, record_tombstones, resync_required_before
 from datetime import timedelta
 
 # Constants
 TASK_NOT_FOUND_MSG = "Task not found"
+PARENT_NOT_FOUND_MSG = "Parent task not found"
+PARENT_CYCLE_MSG = "A task cannot be moved under itself or one of its subtasks"
+TASK_VERSION_CONFLICT_MSG = "Task was modified by another request"
+JOB_NOT_FOUND_MSG = "Job not found"
+INVALID_CURSOR_MSG = "Invalid sync cursor"
+TAG_CONFLICT_MSG = "Tags were changed by another request"
+BATCH_SKIPPED_MSG = "Not executed: an earlier operation in the atomic batch failed"
+BATCH_OPERATION_FAILED_MSG = "Operation failed"
+
+# Session.info flag set while an all-or-nothing batch is running
+ATOMIC_BATCH_KEY = "atomic_batch"
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -26,16 +68,198 @@ logger = logging.getLogger(__name__)
 # Create router
 router = APIRouter()
 
+def _commit(db: Session):
+    """Commit, unless inside an atomic batch, which commits once at the end"""
+    if db.info.get(ATOMIC_BATCH_KEY):
+        db.flush()
+    else:
+        db.commit()
+
+def _task_response(task: Task, owner: User) -> TaskSchema:
+    """Serialize a task with its owner attached, avoiding a lazy-load round trip"""
+    set_committed_value(task, "assigned_user", owner)
+    return TaskSchema.from_orm(task)
+
+def _completed_at_for(task_status: Optional[TaskStatus]):
+    """completed_at value for a status write: stamped once on completion, cleared otherwise"""
+    if task_status == TaskStatus.COMPLETED:
+        return func.coalesce(Task.completed_at, func.now())
+    return None
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated sparse fieldset against the Task schema"""
+    if fields is None:
+        return None
+    requested = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in TaskSchema.model_fields]
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown task fields: {', '.join(unknown)}" if unknown else "No task fields requested"
+        )
+    return requested
+
+def _tag_names(names: List[str]) -> List[str]:
+    """Normalize tag names, rejecting empty lists and overlong names"""
+    normalized = normalize_tag_names(names)
+    too_long = [name for name in normalized if len(name) > MAX_TAG_LENGTH]
+    if not normalized or too_long:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Tag names are limited to {MAX_TAG_LENGTH} characters" if too_long else "No tags given"
+        )
+    return normalized
+
+def _parse_tags(tags: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated tag filter"""
+    if tags is None:
+        return None
+    return _tag_names(tags.split(","))
+
+def _column_names(fields: Optional[List[str]]) -> List[str]:
+    """Task table columns needed to serve a fieldset (all of them if none)"""
+    if fields is None:
+        return TASK_COLUMNS
+    return [name for name in TASK_COLUMNS if name in fields or name == "id"]
+
+def _sparse_task(task, fields: List[str], owner: User) -> dict:
+    """Requested fields of a task object or row"""
+    return {
+        field: UserSchema.from_orm(owner) if field == "assigned_user" else getattr(task, field)
+        for field in fields
+    }
+
+def _archived_task_page(
+    current_user: User,
+    skip: int,
+    limit: int,
+    task_status: Optional[TaskStatus],
+    priority: Optional[TaskPriority],
+    tag_filter,
+    columns: List[str],
+    db: Session
+):
+    """Page through hot and archived tasks as one result set"""
+    selects = []
+    for model in (Task, ArchivedTask):
+        stmt = select(*[model.__table__.c[name] for name in columns]).where(
+            model.assigned_user_id == current_user.id
+        )
+        if task_status:
+            stmt = stmt.where(model.status == task_status)
+        if priority:
+            stmt = stmt.where(model.priority == priority)
+        if tag_filter is not None:
+            stmt = stmt.where(model.id.in_(tag_filter))
+        selects.append(stmt)
+    combined = union_all(*selects).subquery()
+    
+    total = db.scalar(select(func.count()).select_from(combined))
+    rows = db.execute(
+        select(combined).order_by(combined.c.id).offset(skip).limit(limit)
+    ).all()
+    return total, rows
+
+def _task_page(
+    current_user: User,
+    skip: int,
+    limit: int,
+    task_status: Optional[TaskStatus],
+    priority: Optional[TaskPriority],
+    include_archived: bool,
+    fields: Optional[List[str]],
+    tag_names: Optional[List[str]],
+    match_all: bool,
+    db: Session
+) -> bytes:
+    """Run the task list query for one page and return the JSON body"""
+    columns = _column_names(fields)
+    # Tag filter runs as an IN subquery of the same statement
+    tag_filter = tagged_task_ids(current_user.id, tag_names, match_all) if tag_names else None
+    if include_archived:
+        total, tasks = _archived_task_page(current_user, skip, limit, task_status, priority, tag_filter, columns, db)
+    else:
+        query = db.query(Task).filter(Task.assigned_user_id == current_user.id)
+        
+        # Apply filters
+        if task_status:
+            query = query.filter(Task.status == task_status)
+        if priority:
+            query = query.filter(Task.priority == priority)
+        if tag_filter is not None:
+            query = query.filter(Task.id.in_(tag_filter))
+        
+        # Get total count without selecting any task columns
+        total = query.with_entities(func.count(Task.id)).scalar()
+        
+        if fields is not None:
+            # Only select what was asked for; description stays deferred unless requested
+            query = query.options(load_only(*[getattr(Task, name) for name in columns]))
+        
+        # Apply pagination
+        tasks = query.offset(skip).limit(limit).all()
+    
+    if fields is not None:
+        return json.dumps(jsonable_encoder({
+            "tasks": [_sparse_task(task, fields, current_user) for task in tasks],
+            "total": total,
+            "page": skip // limit + 1,
+            "size": limit
+        })).encode()
+    
+    if include_archived:
+        tasks = [TaskSchema(**row._mapping, assigned_user=current_user) for row in tasks]
+    else:
+        tasks = [TaskSchema.from_orm(task) for task in tasks]
+    return TaskListResponse(
+        tasks=tasks,
+        total=total,
+        page=skip // limit + 1,
+        size=limit
+    ).model_dump_json().encode()
+
+def _missing_or_conflict(db: Session, task_id: int, user_id: int, expected_version: Optional[int]):
+    """Explain why a scoped write matched no rows: 409 if the task exists, else 404"""
+    if expected_version is not None:
+        if user_task_exists(db, task_id, user_id):
+            return HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=TASK_VERSION_CONFLICT_MSG
+            )
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=TASK_NOT_FOUND_MSG
+    )
+
+def _owned_task_ids(db: Session, task_ids: List[int], user_id: int) -> List[int]:
+    """De-duplicated task ids, after checking in one query that the user owns them all"""
+    task_ids = list(dict.fromkeys(task_ids))
+    owned = db.scalar(
+        select(func.count()).select_from(Task).where(Task.id.in_(task_ids), Task.assigned_user_id == user_id)
+    )
+    if owned != len(task_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=TASK_NOT_FOUND_MSG)
+    return task_ids
+
+def _owned_task(db: Session, task_id: int, user_id: int, detail: str = TASK_NOT_FOUND_MSG) -> Task:
+    """Load one of the user's tasks or raise 404"""
+    task = user_task(db, task_id, user_id)
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+    return task
+
 # Authentication routes
 @router.post("/auth/signup", response_model=UserSchema)
-async def signup(user: UserCreate, db: Session = Depends(get_db)):
+def signup(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
+    user_id = None
     try:
         logger.info("Attempting to create user: %s", user.username)
         
-        # Check if user already exists
-        db_user = db.query(User).filter(
-            (User.username == user.username) | (User.email == user.email)
+        # Check if user already exists (in the global directory when sharded)
+        registry = UserDirectory if is_sharded(db) else User
+        db_user = db.query(registry).filter(
+            (registry.username == user.username) | (registry.email == user.email)
         ).first()
         if db_user:
             logger.warning("User already exists: %s", user.username)
@@ -44,9 +268,15 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
                 detail="Username or email already registered"
             )
         
+        # When sharded, the directory allocates the id that picks the user's shard
+        if is_sharded(db):
+            user_id = reserve_user_id(db, user.username, user.email)
+            route_to_user(db, user_id)
+        
         # Create new user
         hashed_password = get_password_hash(user.password)
         db_user = User(
+            id=user_id,
             username=user.username,
             email=user.email,
             hashed_password=hashed_password
@@ -60,20 +290,28 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     except IntegrityError as e:
         logger.error("Database integrity error during signup: %s", e)
         db.rollback()
+        if user_id is not None:
+            release_user_id(db, user_id)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username or email already registered"
         ) from e
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Unexpected error during signup: %s", e)
         db.rollback()
+        if user_id is not None:
+            release_user_id(db, user_id)
+        if is_busy_error(e):
+            raise
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during signup"
         ) from e
 
 @router.post("/auth/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     """Login and get access token"""
     user = authenticate_user(db, user_credentials.username, user_credentials.password)
     if not user:
@@ -84,50 +322,60 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         )
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 # User routes
 @router.get("/users/me", response_model=UserSchema)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return current_user
 
 # Task routes
 @router.get("/tasks", response_model=TaskListResponse)
-async def get_tasks(
+def get_tasks(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     task_status: Optional[TaskStatus] = Query(None),
     priority: Optional[TaskPriority] = Query(None),
+    include_archived: bool = Query(False),
+    fields: Optional[str] = Query(None, description="Comma-separated task fields to return"),
+    tags: Optional[str] = Query(None, description="Comma-separated tag names to filter by"),
+    match: Literal["all", "any"] = Query("all", description="Require all of the tags, or any of them"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get tasks with optional filtering"""
-    query = db.query(Task).filter(Task.assigned_user_id == current_user.id)
-    
-    # Apply filters
-    if task_status:
-        query = query.filter(Task.status == task_status)
-    if priority:
-        query = query.filter(Task.priority == priority)
-    
-    # Get total count
-    total = query.count()
+    field_list = _parse_fields(fields)
+    tag_names = _parse_tags(tags)
+    cache_params = {
+        "skip": skip,
+        "limit": limit,
+        "status": task_status.value if task_status else None,
+        "priority": priority.value if priority else None,
+        "include_archived": include_archived,
+        "fields": ",".join(field_list) if field_list else None,
+        "tags": ",".join(sorted(tag_names)) if tag_names else None,
+        "match": match,
+    }
+    use_cache = task_list_cache is not None and not has_pending_invalidation(db, current_user.id)
+    if use_cache:
+        cache_key = task_list_cache.key(current_user.id, cache_params)
+        body = task_list_cache.get(cache_key)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
     
-    # Apply pagination
-    tasks = query.offset(skip).limit(limit).all()
-    
-    return TaskListResponse(
-        tasks=[TaskSchema.from_orm(task) for task in tasks],
-        total=total,
-        page=skip // limit + 1,
-        size=limit
+    body = _task_page(
+        current_user, skip, limit, task_status, priority, include_archived, field_list,
+        tag_names, match == "all", db
     )
+    if use_cache:
+        task_list_cache.set(cache_key, body)
+    return Response(content=body, media_type="application/json")
 
 @router.post("/tasks", response_model=TaskSchema)
-async def create_task(
+def create_task(
     task: TaskCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -139,85 +387,495 @@ async def create_task(
         # Automatically assign task to current user
         task_data = task.dict()
         task_data['assigned_user_id'] = current_user.id
+        if task.parent_id is not None:
+            _owned_task(db, task.parent_id, current_user.id, PARENT_NOT_FOUND_MSG)
+        task_data['change_seq'] = next_change_seq(db, current_user.id)
+        if task_data['status'] == TaskStatus.COMPLETED:
+            task_data['completed_at'] = func.now()
         
-        db_task = Task(**task_data)
-        db.add(db_task)
-        db.commit()
-        db.refresh(db_task)
+        # Single INSERT ... RETURNING round trip, serialized before commit
+        # so that expire-on-commit does not trigger a refresh
+        db_task = db.scalars(insert(Task).values(**task_data).returning(Task)).one()
+        response = _task_response(db_task, current_user)
+        if task.parent_id is not None:
+            link_subtask(db, response.id, task.parent_id)
+        audit_log.record(db, [task_event(response.id, current_user.id, TaskEventAction.CREATED)])
+        invalidate_task_lists(db, current_user.id)
+        _commit(db)
         
-        logger.info("Task created successfully: %s", db_task.id)
-        return db_task
+        logger.info("Task created successfully: %s", response.id)
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error creating task: %s", e)
         db.rollback()
+        if is_busy_error(e):
+            raise
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create task"
         ) from e
 
+@router.get("/tasks/changes", response_model=TaskChangesResponse)
+def get_task_changes(
+    since: str = Query("0", description="Cursor returned by the previous sync; 0 for a first sync"),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get tasks created, updated or deleted after a sync cursor.
+    
+    Changes come back in change-sequence order. When the deletions a cursor
+    depends on have been compacted away, full_resync is set and the client
+    must refetch its task list, then continue from the returned cursor.
+    """
+    try:
+        cursor = int(since)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR_MSG) from e
+    if cursor < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR_MSG)
+    
+    resync_before = resync_required_before(db, current_user.id)
+    if 0 < cursor < resync_before:
+        latest = db.scalar(
+            select(func.max(Task.change_seq)).where(Task.assigned_user_id == current_user.id)
+        )
+        latest_deleted = db.scalar(
+            select(func.max(TaskTombstone.change_seq)).where(TaskTombstone.user_id == current_user.id)
+        )
+        return TaskChangesResponse(
+            tasks=[],
+            deleted=[],
+            cursor=str(max(latest or 0, latest_deleted or 0, resync_before)),
+            has_more=False,
+            full_resync=True
+        )
+    
+    # Both reads use the (user, change_seq) indexes; merge them in sequence order
+    tasks = db.query(Task).filter(
+        Task.assigned_user_id == current_user.id,
+        Task.change_seq > cursor
+    ).order_by(Task.change_seq).limit(limit + 1).all()
+    tombstones = db.query(TaskTombstone).filter(
+        TaskTombstone.user_id == current_user.id,
+        TaskTombstone.change_seq > cursor
+    ).order_by(TaskTombstone.change_seq).limit(limit + 1).all()
+    changes = sorted(tasks + tombstones, key=lambda change: change.change_seq)
+    
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    return TaskChangesResponse(
+        tasks=[TaskSchema.from_orm(change) for change in changes if isinstance(change, Task)],
+        deleted=[change.task_id for change in changes if isinstance(change, TaskTombstone)],
+        cursor=str(changes[-1].change_seq if changes else cursor),
+        has_more=has_more
+    )
+
 @router.get("/tasks/{task_id}", response_model=TaskSchema)
-async def get_task(
+def get_task(
     task_id: int,
+    fields: Optional[str] = Query(None, description="Comma-separated task fields to return"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific task"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.assigned_user_id == current_user.id
-    ).first()
+    field_list = _parse_fields(fields)
+    if field_list is None:
+        task = user_task(db, task_id, current_user.id)
+    else:
+        task = db.query(Task).filter(
+            Task.id == task_id,
+            Task.assigned_user_id == current_user.id
+        ).options(load_only(*[getattr(Task, name) for name in _column_names(field_list)])).first()
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=TASK_NOT_FOUND_MSG
         )
+    if field_list is not None:
+        return JSONResponse(jsonable_encoder(_sparse_task(task, field_list, current_user)))
     return task
 
 @router.put("/tasks/{task_id}", response_model=TaskSchema)
-async def update_task(
+def update_task(
     task_id: int,
     task_update: TaskUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Update a task"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.assigned_user_id == current_user.id
-    ).first()
+    """Update a task; a request without changes returns the task untouched"""
+    update_data = task_update.dict(exclude_unset=True)
+    expected_version = update_data.pop("version", None)
+    if not update_data:
+        # No write, so no new version or sync change for other clients
+        task = user_task(db, task_id, current_user.id)
+        if not task:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=TASK_NOT_FOUND_MSG)
+        if expected_version is not None and task.version != expected_version:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=TASK_VERSION_CONFLICT_MSG)
+        return _task_response(task, current_user)
+    events = [
+        task_event(task_id, current_user.id, TaskEventAction.UPDATED, field, value)
+        for field, value in update_data.items()
+    ]
+    if "status" in update_data:
+        update_data["completed_at"] = _completed_at_for(update_data["status"])
+    
+    # Scoped UPDATE ... RETURNING: lookup, write and reload in one round trip
+    stmt = (
+        update(Task)
+        .where(Task.id == task_id, Task.assigned_user_id == current_user.id)
+        .values(**update_data, version=Task.version + 1, change_seq=next_change_seq(db, current_user.id))
+        .returning(Task)
+        .execution_options(synchronize_session=False)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Task.version == expected_version)
+    
+    task = db.scalars(stmt).first()
     if not task:
+        db.rollback()
+        raise _missing_or_conflict(db, task_id, current_user.id, expected_version)
+    
+    response = _task_response(task, current_user)
+    audit_log.record(db, events)
+    invalidate_task_lists(db, current_user.id)
+    _commit(db)
+    return response
+
+@router.delete("/tasks/{task_id}")
+def delete_task(
+    task_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Delete a task together with all of its subtasks"""
+    deleted = delete_user_task_tree(db, task_id, current_user.id)
+    if not any(row.id == task_id for row in deleted):
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=TASK_NOT_FOUND_MSG
         )
     
-    # Update only provided fields
-    update_data = task_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(task, field, value)
+    task_ids = [row.id for row in deleted]
+    # A top-level task without subtasks has no closure rows to remove
+    if len(deleted) > 1 or deleted[0].parent_id is not None:
+        unlink_tasks(db, task_ids)
+    drop_task_tags(db, task_ids)
+    record_tombstones(db, task_ids, current_user.id)
+    audit_log.record(db, [
+        task_event(deleted_id, current_user.id, TaskEventAction.DELETED) for deleted_id in task_ids
+    ])
+    invalidate_task_lists(db, current_user.id)
+    _commit(db)
+    return {"message": "Task deleted successfully"}
+
+@router.put("/tasks/{task_id}/parent", response_model=TaskSchema)
+def move_task(
+    task_id: int,
+    move: TaskMove,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Move a task, with its subtasks, under another task or to the top level"""
+    if move.parent_id is not None:
+        _owned_task(db, move.parent_id, current_user.id, PARENT_NOT_FOUND_MSG)
+        if is_in_subtree(db, task_id, move.parent_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=PARENT_CYCLE_MSG)
     
-    db.commit()
-    db.refresh(task)
-    return task
+    stmt = (
+        update(Task)
+        .where(Task.id == task_id, Task.assigned_user_id == current_user.id)
+        .values(parent_id=move.parent_id, version=Task.version + 1, change_seq=next_change_seq(db, current_user.id))
+        .returning(Task)
+        .execution_options(synchronize_session=False)
+    )
+    if move.version is not None:
+        stmt = stmt.where(Task.version == move.version)
+    task = db.scalars(stmt).first()
+    if not task:
+        db.rollback()
+        raise _missing_or_conflict(db, task_id, current_user.id, move.version)
+    
+    response = _task_response(task, current_user)
+    move_subtree(db, task_id, move.parent_id)
+    audit_log.record(db, [
+        task_event(task_id, current_user.id, TaskEventAction.UPDATED, "parent_id", move.parent_id)
+    ])
+    invalidate_task_lists(db, current_user.id)
+    _commit(db)
+    return response
 
-@router.delete("/tasks/{task_id}")
-async def delete_task(
+@router.get("/tasks/{task_id}/history", response_model=TaskHistoryResponse)
+def get_task_history(
+    task_id: int,
+    after: Optional[int] = Query(None, ge=0, description="Return events after this event id"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the change history of a task, oldest first, paginated by event id"""
+    query = db.query(TaskEvent).filter(
+        TaskEvent.task_id == task_id,
+        TaskEvent.user_id == current_user.id
+    )
+    if after is not None:
+        query = query.filter(TaskEvent.id > after)
+    events = query.order_by(TaskEvent.id).limit(limit + 1).all()
+    
+    has_more = len(events) > limit
+    events = events[:limit]
+    return TaskHistoryResponse(
+        events=[TaskEventSchema.from_orm(event) for event in events],
+        next_after=events[-1].id if has_more else None
+    )
+
+@router.get("/tasks/{task_id}/subtree", response_model=TaskSubtreeResponse)
+def get_task_subtree(
+    task_id: int,
+    max_depth: Optional[int] = Query(None, ge=1, description="Only include subtasks down to this depth"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a task and all of its subtasks, breadth first, with rolled-up progress.
+    
+    The subtasks come from one indexed closure-table query however deep the
+    tree is, and every node's progress from one grouped query.
+    """
+    root = _owned_task(db, task_id, current_user.id)
+    query = db.query(Task, TaskClosure.depth).join(
+        TaskClosure, TaskClosure.descendant_id == Task.id
+    ).filter(TaskClosure.ancestor_id == task_id)
+    if max_depth is not None:
+        query = query.filter(TaskClosure.depth <= max_depth)
+    nodes = [(root, 0)] + query.order_by(TaskClosure.depth, Task.id).all()
+    progress = subtree_progress(db, task_id)
+    
+    tasks = []
+    for task, depth in nodes:
+        subtasks, completed = progress.get(task.id, (0, 0))
+        tasks.append(TaskNode(
+            **TaskSchema.from_orm(task).model_dump(),
+            depth=depth,
+            subtasks=subtasks,
+            completed_subtasks=completed,
+            progress=progress_percent(task.status, subtasks, completed)
+        ))
+    return TaskSubtreeResponse(tasks=tasks)
+
+@router.get("/tasks/{task_id}/ancestors", response_model=TaskAncestorsResponse)
+def get_task_ancestors(
+    task_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the chain of parents of a task, top-level task first"""
+    _owned_task(db, task_id, current_user.id)
+    ancestors = db.query(Task).join(
+        TaskClosure, TaskClosure.ancestor_id == Task.id
+    ).filter(
+        TaskClosure.descendant_id == task_id
+    ).order_by(TaskClosure.depth.desc()).all()
+    return TaskAncestorsResponse(tasks=[TaskSchema.from_orm(task) for task in ancestors])
+
+@router.get("/tasks/{task_id}/progress", response_model=TaskProgress)
+def get_task_progress(
+    task_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the share of a task's subtasks (at any depth) that are completed"""
+    task = _owned_task(db, task_id, current_user.id)
+    subtasks, completed = subtree_progress(db, task_id, include_descendants=False).get(task_id, (0, 0))
+    return TaskProgress(
+        task_id=task_id,
+        subtasks=subtasks,
+        completed_subtasks=completed,
+        progress=progress_percent(task.status, subtasks, completed)
+    )
+
+@router.get("/tasks/{task_id}/tags", response_model=TaskTags)
+def get_task_tags(
     task_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a task"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.assigned_user_id == current_user.id
+    """Get the tags of a task, alphabetically"""
+    _owned_task(db, task_id, current_user.id)
+    return TaskTags(task_id=task_id, tags=task_tag_names(db, [task_id])[task_id])
+
+# Tag routes
+@router.get("/tags", response_model=TagListResponse)
+def get_tags(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the user's tags in use with the number of tasks carrying each"""
+    tags = db.query(Tag).filter(
+        Tag.user_id == current_user.id,
+        Tag.task_count > 0
+    ).order_by(Tag.name).all()
+    return TagListResponse(tags=[TagSchema.from_orm(tag) for tag in tags])
+
+def _change_tags(operation: TagOperation, current_user: User, db: Session, add: bool) -> TagOperationResult:
+    """Add or remove tags on many tasks in a few set-based statements"""
+    names = _tag_names(operation.tags)
+    task_ids = _owned_task_ids(db, operation.task_ids, current_user.id)
+    try:
+        if add:
+            changed = tag_tasks(db, current_user.id, task_ids, names)
+        else:
+            changed = untag_tasks(db, current_user.id, task_ids, names)
+        if changed:
+            invalidate_task_lists(db, current_user.id)
+        _commit(db)
+    except IntegrityError as e:
+        # A concurrent request created the same tag or link first
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=TAG_CONFLICT_MSG) from e
+    return TagOperationResult(changed=changed)
+
+@router.post("/tags/apply", response_model=TagOperationResult)
+def apply_tags(
+    operation: TagOperation,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add tags to many tasks at once, creating tags as needed"""
+    return _change_tags(operation, current_user, db, add=True)
+
+@router.post("/tags/remove", response_model=TagOperationResult)
+def remove_tags(
+    operation: TagOperation,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Remove tags from many tasks at once"""
+    return _change_tags(operation, current_user, db, add=False)
+
+# Job routes
+@router.get("/jobs/{job_id}", response_model=JobSchema)
+def get_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of a background job"""
+    job = db.query(Job).filter(
+        Job.id == job_id,
+        Job.user_id == current_user.id
     ).first()
-    if not task:
+    if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=TASK_NOT_FOUND_MSG
+            detail=JOB_NOT_FOUND_MSG
+        )
+    return job
+
+# Batch routes
+def _run_batch_operation(operation: BatchOperation, current_user: User, db: Session):
+    """Dispatch one batch operation to its route handler and return the JSON body"""
+    args = operation.args
+    if operation.op == "get_current_user":
+        result = UserSchema.from_orm(get_current_user_info(current_user))
+    elif operation.op == "list_tasks":
+        response = get_tasks(**TaskListParams(**args).dict(), current_user=current_user, db=db)
+        return json.loads(response.body)
+    elif operation.op == "get_task":
+        params = TaskDetailParams(**args)
+        result = get_task(params.task_id, params.fields, current_user=current_user, db=db)
+        if isinstance(result, Response):
+            return json.loads(result.body)
+        result = TaskSchema.from_orm(result)
+    elif operation.op == "create_task":
+        result = create_task(TaskCreate(**args), current_user=current_user, db=db)
+    elif operation.op == "update_task":
+        task_update = TaskUpdateOperation(**args)
+        result = update_task(
+            task_update.task_id,
+            TaskUpdate(**task_update.dict(exclude={"task_id"}, exclude_unset=True)),
+            current_user=current_user,
+            db=db
         )
+    elif operation.op == "tag_tasks":
+        result = apply_tags(TagOperation(**args), current_user=current_user, db=db)
+    elif operation.op == "untag_tasks":
+        result = remove_tags(TagOperation(**args), current_user=current_user, db=db)
+    else:
+        result = delete_task(TaskRef(**args).task_id, current_user=current_user, db=db)
+    return jsonable_encoder(result)
+
+@router.post("/batch", response_model=BatchResponse)
+def run_batch(
+    batch: BatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Run an ordered list of task and user operations in one request.
     
-    db.delete(task)
-    db.commit()
-    return {"message": "Task deleted successfully"}
+    All operations share the authenticated user and database session. With
+    atomic set, the batch stops at the first failing operation and nothing
+    is committed; otherwise each write commits on its own, and an operation
+    that raises unexpectedly is rolled back and reported with status 500.
+    """
+    results = []
+    failed = False
+    db.info[ATOMIC_BATCH_KEY] = batch.atomic
+    # Keep the authenticated user loaded across per-operation commits
+    db.expire_on_commit = False
+    try:
+        for operation in batch.operations:
+            if failed and batch.atomic:
+                results.append(BatchResult(
+                    op=operation.op,
+                    status=status.HTTP_424_FAILED_DEPENDENCY,
+                    body={"detail": BATCH_SKIPPED_MSG}
+                ))
+                continue
+            try:
+                body = _run_batch_operation(operation, current_user, db)
+                results.append(BatchResult(op=operation.op, status=status.HTTP_200_OK, body=body))
+            except HTTPException as e:
+                failed = True
+                results.append(BatchResult(op=operation.op, status=e.status_code, body={"detail": e.detail}))
+            except ValidationError as e:
+                failed = True
+                results.append(BatchResult(
+                    op=operation.op,
+                    status=422,
+                    body={"detail": jsonable_encoder(e.errors(include_url=False, include_context=False))}
+                ))
+            except SQLAlchemyError as e:
+                logger.error("Database error in batch operation %s: %s", operation.op, e)
+                failed = True
+                db.rollback()
+                results.append(BatchResult(
+                    op=operation.op,
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    body={"detail": BATCH_OPERATION_FAILED_MSG}
+                ))
+            except Exception as e:
+                logger.exception("Error in batch operation %s: %s", operation.op, e)
+                failed = True
+                db.rollback()
+                results.append(BatchResult(
+                    op=operation.op,
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    body={"detail": BATCH_OPERATION_FAILED_MSG}
+                ))
+    finally:
+        db.info.pop(ATOMIC_BATCH_KEY, None)
+    
+    committed = not (failed and batch.atomic)
+    if committed:
+        db.commit()
+    else:
+        db.rollback()
+    return BatchResponse(committed=committed, results=results)
@@ -2,9 +2,9 @@
 Pydantic schemas for request/response validation
 """
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Any, Dict, Literal, Optional, List
 from datetime import datetime
-from .models import TaskStatus, TaskPriority
+from .models import JobStatus, TaskEventAction, TaskStatus, TaskPriority
 
 # User schemas
 class UserBase(BaseModel):
@@ -35,23 +35,100 @@ class TaskBase(BaseModel):
 
 class TaskCreate(TaskBase):
     assigned_user_id: Optional[int] = None
+    parent_id: Optional[int] = Field(None, description="Make the task a subtask of this task")
+
+class TaskMove(BaseModel):
+    parent_id: Optional[int] = Field(None, description="New parent task; null makes the task top-level")
+    version: Optional[int] = Field(None, description="Expected version for optimistic concurrency")
 
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     status: Optional[TaskStatus] = None
     priority: Optional[TaskPriority] = None
+    version: Optional[int] = Field(None, description="Expected version for optimistic concurrency")
+
+class TaskUpdateOperation(TaskUpdate):
+    task_id: int
+
+class TaskRef(BaseModel):
+    task_id: int
+
+class TaskDetailParams(TaskRef):
+    fields: Optional[str] = None
+
+class TaskListParams(BaseModel):
+    skip: int = Field(0, ge=0)
+    limit: int = Field(10, ge=1, le=100)
+    task_status: Optional[TaskStatus] = None
+    priority: Optional[TaskPriority] = None
+    include_archived: bool = False
+    fields: Optional[str] = None
+    tags: Optional[str] = None
+    match: Literal["all", "any"] = "all"
 
 class Task(TaskBase):
     id: int
     assigned_user_id: int
+    parent_id: Optional[int] = None
+    version: int = 1
     created_at: datetime
     updated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     assigned_user: Optional[User] = None
     
     class Config:
         from_attributes = True
 
+class TaskEvent(BaseModel):
+    id: int
+    task_id: int
+    user_id: int
+    action: TaskEventAction
+    field: Optional[str] = None
+    value: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Tag schemas
+class Tag(BaseModel):
+    name: str
+    task_count: int
+    
+    class Config:
+        from_attributes = True
+
+class TagListResponse(BaseModel):
+    tags: List[Tag]
+
+class TaskTags(BaseModel):
+    task_id: int
+    tags: List[str]
+
+class TagOperation(BaseModel):
+    task_ids: List[int] = Field(..., min_length=1, max_length=500)
+    tags: List[str] = Field(..., min_length=1, max_length=20)
+
+class TagOperationResult(BaseModel):
+    changed: int = Field(..., description="Number of task/tag links added or removed")
+
+# Job schemas
+class Job(BaseModel):
+    id: int
+    name: str
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 # Authentication schemas
 class Token(BaseModel):
     access_token: str
@@ -59,6 +136,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
 
 # Response schemas
 class TaskListResponse(BaseModel):
@@ -66,3 +144,54 @@ class TaskListResponse(BaseModel):
     total: int
     page: int
     size: int
+
+class TaskNode(Task):
+    depth: int
+    subtasks: int
+    completed_subtasks: int
+    progress: float
+
+class TaskSubtreeResponse(BaseModel):
+    tasks: List[TaskNode]
+
+class TaskAncestorsResponse(BaseModel):
+    tasks: List[Task]
+
+class TaskProgress(BaseModel):
+    task_id: int
+    subtasks: int
+    completed_subtasks: int
+    progress: float
+
+class TaskChangesResponse(BaseModel):
+    tasks: List[Task]
+    deleted: List[int]
+    cursor: str
+    has_more: bool
+    full_resync: bool = False
+
+class TaskHistoryResponse(BaseModel):
+    events: List[TaskEvent]
+    next_after: Optional[int] = None
+
+# Batch schemas
+class BatchOperation(BaseModel):
+    op: Literal[
+        "get_current_user", "list_tasks", "get_task",
+        "create_task", "update_task", "delete_task",
+        "tag_tasks", "untag_tasks"
+    ]
+    args: Dict[str, Any] = Field(default_factory=dict)
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=50)
+    atomic: bool = Field(False, description="Commit all operations together or none at all")
+
+class BatchResult(BaseModel):
+    op: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
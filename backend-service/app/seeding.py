@@ -0,0 +1,235 @@
+"""
+Synthetic data generation for capacity testing
+"""
+import bisect
+import csv
+import io
+import itertools
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from sqlalchemy import Table, bindparam, func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from .auth import get_password_hash
+from .database import ShardMap
+from .models import Task, TaskPriority, TaskStatus, User, UserDirectory
+from .sync import advance_change_seq, current_change_seq
+
+# Rows generated and written per transaction
+SEED_CHUNK_SIZE = 50000
+
+# Shares of priorities across all tasks
+PRIORITY_WEIGHTS = {TaskPriority.LOW: 30, TaskPriority.MEDIUM: 50, TaskPriority.HIGH: 20}
+
+# Tasks older than this are almost all completed
+SETTLE_DAYS = 30
+
+TITLE_VERBS = ["Fix", "Review", "Write", "Update", "Plan", "Test", "Refactor", "Document", "Deploy", "Investigate"]
+TITLE_OBJECTS = [
+    "login flow", "billing report", "onboarding email", "API docs", "search index",
+    "release notes", "dashboard", "mobile layout", "backup job", "team roadmap",
+]
+
+logger = logging.getLogger(__name__)
+
+def user_rows(start_id: int, count: int, hashed_password: str, created_since: datetime, as_of: datetime, prefix: str = "user") -> Iterator[Dict[str, Any]]:
+    """Users with sequential ids, sharing one password hash"""
+    span = (as_of - created_since).total_seconds()
+    for offset in range(count):
+        user_id = start_id + offset
+        yield {
+            "id": user_id,
+            "username": f"{prefix}{user_id}",
+            "email": f"{prefix}{user_id}@example.com",
+            "hashed_password": hashed_password,
+            "created_at": created_since + timedelta(seconds=span * offset / max(count, 1)),
+        }
+
+def task_rows(rng: random.Random, owner_ids: Sequence[int], count: int, as_of: datetime, history_days: int) -> Iterator[Dict[str, Any]]:
+    """
+    Tasks with skewed ownership and age-dependent status.
+    
+    Busy users own many more tasks than others (log-normal activity), creation times
+    cluster towards as_of, and the older a task is the likelier it is
+    completed, with completion a few days after creation.
+    """
+    owner_weights = list(itertools.accumulate(rng.lognormvariate(0, 1) for _ in owner_ids))
+    priorities, priority_weights = list(PRIORITY_WEIGHTS), list(itertools.accumulate(PRIORITY_WEIGHTS.values()))
+    history = history_days * 86400
+    for _ in range(count):
+        age = history * rng.random() ** 2
+        created_at = as_of - timedelta(seconds=age)
+        settled = min(age / (SETTLE_DAYS * 86400), 1.0)
+        roll = rng.random()
+        completed_at = updated_at = None
+        if roll < 0.2 + 0.75 * settled:
+            status = TaskStatus.COMPLETED
+            completed_at = min(created_at + timedelta(seconds=rng.expovariate(1 / (3 * 86400))), as_of)
+            updated_at = completed_at
+            version = rng.randint(2, 5)
+        elif roll < 0.55 + 0.4 * settled:
+            status = TaskStatus.IN_PROGRESS
+            updated_at = created_at + timedelta(seconds=age * rng.random())
+            version = rng.randint(2, 4)
+        else:
+            status = TaskStatus.PENDING
+            version = 1
+        yield {
+            "title": f"{rng.choice(TITLE_VERBS)} {rng.choice(TITLE_OBJECTS)}",
+            "description": f"Follow-up {rng.randint(1, 9999)} for the {rng.choice(TITLE_OBJECTS)}" if rng.random() < 0.6 else None,
+            "status": status,
+            "priority": priorities[bisect.bisect(priority_weights, rng.random() * priority_weights[-1])],
+            "assigned_user_id": owner_ids[bisect.bisect(owner_weights, rng.random() * owner_weights[-1])],
+            "version": version,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "completed_at": completed_at,
+        }
+
+def _copy_value(value: Any) -> Any:
+    """Render a value for COPY ... FORMAT csv; None stays an unquoted NULL"""
+    if value is None:
+        return None
+    if hasattr(value, "name") and hasattr(value, "value"):
+        # SQLAlchemy stores Python enums by name
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+def _copy_rows(connection: Connection, table: Table, rows: List[Dict[str, Any]]):
+    """Load rows with COPY FROM STDIN (Postgres)"""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+def _executemany_rows(connection: Connection, table: Table, rows: List[Dict[str, Any]]):
+    """Load rows with one DBAPI executemany, compiling the INSERT once"""
+    columns = list(rows[0])
+    compiled = insert(table).values({column: bindparam(column) for column in columns}).compile(dialect=connection.dialect)
+    names = list(compiled.positiontup) if compiled.positional else columns
+    processors = [table.c[name].type.bind_processor(connection.dialect) for name in names]
+    params = [
+        tuple(process(row[name]) if process and row[name] is not None else row[name] for name, process in zip(names, processors))
+        for row in rows
+    ]
+    if not compiled.positional:
+        params = [dict(zip(names, values)) for values in params]
+    connection.exec_driver_sql(compiled.string, params)
+
+def write_rows(engine: Engine, table: Table, rows: List[Dict[str, Any]]):
+    """Insert one chunk of rows in a single transaction: COPY on Postgres, executemany elsewhere"""
+    if not rows:
+        return
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            _copy_rows(connection, table, rows)
+        else:
+            _executemany_rows(connection, table, rows)
+
+def _chunks(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Split a row stream into lists of at most size rows"""
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _next_user_id(shard_map: ShardMap) -> int:
+    """First free user id; the directory allocates ids when sharded"""
+    with Session(shard_map.engines[0]) as db:
+        if len(shard_map) > 1:
+            return (db.scalar(select(func.max(UserDirectory.id))) or 0) + 1
+    last = 0
+    for engine in shard_map.engines:
+        with Session(engine) as db:
+            last = max(last, db.scalar(select(func.max(User.id))) or 0)
+    return last + 1
+
+def _sync_id_sequence(engine: Engine, table: Table):
+    """Move a Postgres serial past explicitly inserted ids"""
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(
+                text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))")
+            )
+
+def seed_database(
+    shard_map: ShardMap,
+    users: int,
+    tasks: int,
+    seed: int = 0,
+    as_of: Optional[datetime] = None,
+    history_days: int = 365,
+    password: str = "password",
+    prefix: str = "user",
+    chunk_size: int = SEED_CHUNK_SIZE
+) -> Dict[str, int]:
+    """
+    Add users and tasks to every shard of shard_map.
+    
+    The generated rows depend only on seed, as_of and the counts (plus the
+    ids already in use), so runs are reproducible. Users and tasks go to
+    their home shard; task change sequence values continue each shard's
+    counter so delta sync sees them as ordinary changes.
+    """
+    if tasks and not users:
+        raise ValueError("Tasks need at least one user to own them")
+    rng = random.Random(seed)
+    as_of = as_of or datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    created_since = as_of - timedelta(days=history_days)
+    hashed_password = get_password_hash(password)
+    sharded = len(shard_map) > 1
+    home = shard_map.shard_for_user if sharded else (lambda _user_id: 0)
+
+    start_id = _next_user_id(shard_map)
+    for chunk in _chunks(user_rows(start_id, users, hashed_password, created_since, as_of, prefix), chunk_size):
+        if sharded:
+            write_rows(shard_map.engines[0], UserDirectory.__table__, [
+                {"id": row["id"], "username": row["username"], "email": row["email"]} for row in chunk
+            ])
+        by_shard: Dict[int, List[Dict[str, Any]]] = {}
+        for row in chunk:
+            by_shard.setdefault(home(row["id"]), []).append(row)
+        for shard_id, rows in by_shard.items():
+            write_rows(shard_map.engines[shard_id], User.__table__, rows)
+    _sync_id_sequence(shard_map.engines[0], UserDirectory.__table__ if sharded else User.__table__)
+    if sharded:
+        for engine in shard_map.engines:
+            _sync_id_sequence(engine, User.__table__)
+
+    owner_ids = range(start_id, start_id + users)
+    change_seq = {}
+    for shard_id, engine in enumerate(shard_map.engines):
+        with Session(engine) as db:
+            change_seq[shard_id] = current_change_seq(db)
+    for written, chunk in enumerate(_chunks(task_rows(rng, owner_ids, tasks, as_of, history_days), chunk_size)):
+        by_shard = {}
+        for row in chunk:
+            shard_id = home(row["assigned_user_id"])
+            change_seq[shard_id] += 1
+            row["change_seq"] = change_seq[shard_id]
+            by_shard.setdefault(shard_id, []).append(row)
+        for shard_id, rows in by_shard.items():
+            write_rows(shard_map.engines[shard_id], Task.__table__, rows)
+        logger.info("Seeded %s of %s tasks", min((written + 1) * chunk_size, tasks), tasks)
+    for shard_id, engine in enumerate(shard_map.engines):
+        with Session(engine) as db:
+            advance_change_seq(db, change_seq[shard_id])
+            db.commit()
+    return {"users": users, "tasks": tasks, "first_user_id": start_id}
@@ -0,0 +1,225 @@
+"""
+Shard-aware user directory and rebalancing between shard maps
+"""
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy import bindparam, delete, func, insert, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from .archive import TASK_COLUMNS, move_to_archive
+from .database import Base, ShardMap, shard_count
+from .models import ArchivedTask, Tag, Task, TaskClosure, TaskEvent, TaskTag, TaskTombstone, User, UserDirectory
+from .tags import ensure_tags
+from .sync import advance_change_seq, current_change_seq, mark_resync_required, next_change_seqs
+
+REBALANCE_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+def find_user_id(db: Session, username: str) -> Optional[int]:
+    """Look up a user's id in the global directory"""
+    return db.scalar(select(UserDirectory.id).where(UserDirectory.username == username))
+
+def reserve_user_id(db: Session, username: str, email: str) -> int:
+    """Claim a username/email in the directory and allocate the user's id"""
+    user_id = db.scalar(
+        insert(UserDirectory).values(username=username, email=email).returning(UserDirectory.id)
+    )
+    db.commit()
+    return user_id
+
+def release_user_id(db: Session, user_id: int):
+    """Undo reserve_user_id() after the user row could not be created"""
+    db.rollback()
+    db.execute(delete(UserDirectory).where(UserDirectory.id == user_id))
+    db.commit()
+
+def is_sharded(db: Session) -> bool:
+    """Whether db spreads users over several shards"""
+    return shard_count(db) > 1
+
+def _copy_tasks(source: Session, target: Session, tasks, archived: bool) -> Dict[int, int]:
+    """Bulk-insert tasks on the target under new ids, without parents; returns old id -> new id"""
+    rows = [{name: getattr(task, name) for name in TASK_COLUMNS if name not in ("id", "parent_id")} for task in tasks]
+    for row, change_seq in zip(rows, next_change_seqs(target, len(rows), tasks[0].assigned_user_id)):
+        row["change_seq"] = change_seq
+    new_ids = target.scalars(insert(Task).returning(Task.id, sort_by_parameter_order=True), rows).all()
+    id_map = dict(zip((task.id for task in tasks), new_ids))
+
+    events = source.scalars(select(TaskEvent).where(TaskEvent.task_id.in_(list(id_map)))).all()
+    if events:
+        target.execute(insert(TaskEvent), [
+            {
+                "task_id": id_map[event.task_id],
+                "user_id": event.user_id,
+                "action": event.action,
+                "field": event.field,
+                "value": event.value,
+                "created_at": event.created_at,
+            }
+            for event in events
+        ])
+    if archived:
+        move_to_archive(target, new_ids)
+    return id_map
+
+def _delete_user_data(db: Session, user_id: int):
+    """Delete a user and everything stored for them in db's database"""
+    task_ids = select(Task.id).where(Task.assigned_user_id == user_id)
+    db.execute(delete(TaskClosure).where(TaskClosure.descendant_id.in_(task_ids)))
+    db.execute(delete(TaskTag).where(TaskTag.tag_id.in_(select(Tag.id).where(Tag.user_id == user_id))))
+    for model in (TaskEvent, TaskTombstone, Tag):
+        db.execute(delete(model).where(model.user_id == user_id))
+    for model in (Task, ArchivedTask):
+        db.execute(delete(model).where(model.assigned_user_id == user_id))
+    db.execute(delete(User).where(User.id == user_id))
+
+def move_user(user_id: int, source_engine: Engine, target_engine: Engine, batch_size: int = REBALANCE_BATCH_SIZE) -> int:
+    """
+    Move a user and all of their tasks from one database to another.
+    
+    The copy is written to the target in one transaction, after deleting
+    whatever an earlier interrupted move left there, and only then is the
+    user deleted from the source in a second one; a move that failed at
+    any point can be rerun and leaves exactly one copy. Task ids are per
+    database, so moved tasks get new ids: parent links, the subtask closure
+    and tag links are remapped in the same target transaction, and the
+    user's sync cursors are invalidated to make clients refetch.
+    """
+    id_map: Dict[int, int] = {}
+    parents = {Task: {}, ArchivedTask: {}}
+    with Session(source_engine) as source, Session(target_engine) as target:
+        user = source.get(User, user_id)
+        if user is None:
+            return 0
+        _delete_user_data(target, user_id)
+        target.execute(insert(User).values(
+            {column.name: getattr(user, column.name) for column in User.__table__.columns}
+        ))
+        # Keep the target's change sequence ahead of any cursor issued by the source
+        advance_change_seq(target, current_change_seq(source))
+        closure = source.execute(
+            select(TaskClosure.ancestor_id, TaskClosure.descendant_id, TaskClosure.depth)
+            .join(Task, Task.id == TaskClosure.descendant_id)
+            .where(Task.assigned_user_id == user_id)
+        ).all()
+        tag_links = source.execute(
+            select(TaskTag.task_id, Tag.name).join(Tag, Tag.id == TaskTag.tag_id).where(Tag.user_id == user_id)
+        ).all()
+        tag_names = source.scalars(select(Tag.name).where(Tag.user_id == user_id)).all()
+        tag_ids = ensure_tags(target, user_id, tag_names) if tag_names else {}
+
+        for model, archived in ((Task, False), (ArchivedTask, True)):
+            last_id = 0
+            while True:
+                tasks = source.scalars(
+                    select(model)
+                    .where(model.assigned_user_id == user_id, model.id > last_id)
+                    .order_by(model.id)
+                    .limit(batch_size)
+                ).all()
+                if not tasks:
+                    break
+                last_id = tasks[-1].id
+                batch_map = _copy_tasks(source, target, tasks, archived)
+                id_map.update(batch_map)
+                parents[model].update(
+                    (batch_map[task.id], task.parent_id) for task in tasks if task.parent_id is not None
+                )
+                source.expunge_all()
+
+        for model, children in parents.items():
+            remapped = [
+                {"new_id": new_id, "new_parent_id": id_map.get(parent_id)}
+                for new_id, parent_id in children.items()
+            ]
+            if remapped:
+                target.execute(
+                    update(model.__table__)
+                    .where(model.__table__.c.id == bindparam("new_id"))
+                    .values(parent_id=bindparam("new_parent_id")),
+                    remapped
+                )
+        links = [
+            {"ancestor_id": id_map[row.ancestor_id], "descendant_id": id_map[row.descendant_id], "depth": row.depth}
+            for row in closure if row.ancestor_id in id_map and row.descendant_id in id_map
+        ]
+        if links:
+            target.execute(insert(TaskClosure), links)
+        tagged = [
+            {"task_id": id_map[row.task_id], "tag_id": tag_ids[row.name]}
+            for row in tag_links if row.task_id in id_map
+        ]
+        if tagged:
+            target.execute(insert(TaskTag), tagged)
+        if tag_ids:
+            target.execute(
+                update(Tag)
+                .where(Tag.user_id == user_id)
+                .values(task_count=select(func.count()).where(TaskTag.tag_id == Tag.id).scalar_subquery())
+                .execution_options(synchronize_session=False)
+            )
+        mark_resync_required(target, user_id)
+        target.commit()
+
+        _delete_user_data(source, user_id)
+        source.commit()
+    logger.info("Moved user %s with %s tasks", user_id, len(id_map))
+    return len(id_map)
+
+def backfill_directory(directory_engine: Engine, engines: List[Engine]) -> int:
+    """Register users created before sharding in the user directory; returns how many"""
+    users = {}
+    for engine in engines:
+        with Session(engine) as db:
+            users.update((user.id, user) for user in db.execute(select(User.id, User.username, User.email)))
+    with Session(directory_engine) as directory:
+        known = set(directory.scalars(select(UserDirectory.id)).all())
+        missing = [
+            {"id": user.id, "username": user.username, "email": user.email}
+            for user_id, user in sorted(users.items()) if user_id not in known
+        ]
+        if missing:
+            directory.execute(insert(UserDirectory), missing)
+            if directory.get_bind().dialect.name == "postgresql":
+                # Explicit ids do not advance the serial; new signups must not reuse them
+                directory.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('user_directory', 'id'), (SELECT max(id) FROM user_directory))"
+                ))
+            directory.commit()
+    if missing:
+        logger.info("Added %s existing users to the user directory", len(missing))
+    return len(missing)
+
+def rebalance(current: ShardMap, target: ShardMap, batch_size: int = REBALANCE_BATCH_SIZE, dry_run: bool = False) -> Dict[int, int]:
+    """
+    Move every user whose home shard differs between two shard maps.
+    
+    Shards are matched by URL, so maps may share databases. Both maps must
+    start with the same database, which holds the user directory; users
+    created before sharding are added to it first. Returns user id ->
+    number of tasks moved.
+    """
+    if current.urls[0] != target.urls[0]:
+        raise ValueError("Both shard maps must start with the same database")
+    engines = dict(zip(current.urls, current.engines))
+    for url, engine in zip(target.urls, target.engines):
+        engines.setdefault(url, engine)
+    for engine in engines.values():
+        Base.metadata.create_all(bind=engine)
+    if not dry_run:
+        backfill_directory(engines[current.urls[0]], [engines[url] for url in current.urls])
+
+    moves = {}
+    for url in current.urls:
+        with Session(engines[url]) as db:
+            user_ids = db.scalars(select(User.id).order_by(User.id)).all()
+        for user_id in user_ids:
+            destination = target.urls[target.shard_for_user(user_id)]
+            if destination == url:
+                continue
+            if dry_run:
+                moves[user_id] = 0
+                continue
+            moves[user_id] = move_user(user_id, engines[url], engines[destination], batch_size)
+    return moves
@@ -0,0 +1,156 @@
+"""
+Delta sync support: change sequence, tombstones and their compaction
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.orm import Session
+from .database import for_each_shard
+from .jobs import job_handler
+from .models import SyncState, TaskTombstone, task_change_seq
+
+# Tombstone retention; cursors older than the compacted range must fully resync
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_COMPACT_BATCH_SIZE = int(os.getenv("TOMBSTONE_COMPACT_BATCH_SIZE", "1000"))
+TOMBSTONE_COMPACT_INTERVAL_SECONDS = int(os.getenv("TOMBSTONE_COMPACT_INTERVAL_SECONDS", "86400"))
+
+# SyncState keys
+CHANGE_SEQ_KEY = "task_change_seq"
+COMPACTED_THROUGH_KEY = "tombstones_compacted_through"
+
+# First key of the PostgreSQL advisory locks ordering each user's changes
+CHANGE_SEQ_LOCK_CLASS = 7301
+
+def _order_user_changes(db: Session, user_id: int):
+    """
+    Hold user_id's change lock until db's transaction ends (PostgreSQL).
+    
+    nextval() hands out values when it is called, not at commit, so two
+    transactions writing the same user's tasks could commit out of sequence
+    order and a client syncing in between would skip the earlier change.
+    Holding the lock from taking a value until commit makes a user's
+    changes commit in sequence order; cursors are per user, so other users'
+    writes may still interleave freely.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(CHANGE_SEQ_LOCK_CLASS, user_id)))
+
+def next_change_seq(db: Session, user_id: int):
+    """
+    Next value of the task change sequence for a change to user_id's tasks.
+    
+    On Postgres this is an inline nextval(), taken under the user's change
+    lock. Elsewhere a SyncState counter row is bumped first; SQLite
+    serializes writers until commit, so the values commit in order.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        _order_user_changes(db, user_id)
+        return task_change_seq.next_value()
+    value = db.scalar(
+        update(SyncState)
+        .where(SyncState.key == CHANGE_SEQ_KEY)
+        .values(value=SyncState.value + 1)
+        .returning(SyncState.value)
+    )
+    if value is None:
+        value = 1
+        db.execute(insert(SyncState).values(key=CHANGE_SEQ_KEY, value=value))
+    return value
+
+def advance_change_seq(db: Session, at_least: int):
+    """Make sure future change sequence values are greater than at_least"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT setval('task_change_seq', :value) WHERE :value > (SELECT last_value FROM task_change_seq)"),
+            {"value": at_least}
+        )
+    elif current_change_seq(db) < at_least:
+        _set_state(db, CHANGE_SEQ_KEY, at_least)
+
+def current_change_seq(db: Session) -> int:
+    """Latest change sequence value handed out"""
+    if db.get_bind().dialect.name == "postgresql":
+        return db.scalar(text("SELECT last_value FROM task_change_seq"))
+    return db.scalar(select(SyncState.value).where(SyncState.key == CHANGE_SEQ_KEY)) or 0
+
+def next_change_seqs(db: Session, count: int, user_id: int) -> List[int]:
+    """count change sequence values for a multi-row write to user_id's tasks"""
+    if db.get_bind().dialect.name == "postgresql":
+        _order_user_changes(db, user_id)
+        return db.scalars(
+            text("SELECT nextval('task_change_seq') FROM generate_series(1, :count)"), {"count": count}
+        ).all()
+    last = db.scalar(
+        update(SyncState)
+        .where(SyncState.key == CHANGE_SEQ_KEY)
+        .values(value=SyncState.value + count)
+        .returning(SyncState.value)
+    )
+    if last is None:
+        last = count
+        db.execute(insert(SyncState).values(key=CHANGE_SEQ_KEY, value=last))
+    return list(range(last - count + 1, last + 1))
+
+def record_tombstone(db: Session, task_id: int, user_id: int):
+    """Leave a tombstone for a deleted task"""
+    record_tombstones(db, [task_id], user_id)
+
+def record_tombstones(db: Session, task_ids: List[int], user_id: int):
+    """Leave tombstones for tasks deleted together, in one INSERT"""
+    db.execute(insert(TaskTombstone).values([
+        {"task_id": task_id, "user_id": user_id, "change_seq": change_seq}
+        for task_id, change_seq in zip(task_ids, next_change_seqs(db, len(task_ids), user_id))
+    ]))
+
+def _set_state(db: Session, key: str, value: int):
+    """Upsert a SyncState value"""
+    updated = db.execute(update(SyncState).where(SyncState.key == key).values(value=value)).rowcount
+    if not updated:
+        db.execute(insert(SyncState).values(key=key, value=value))
+
+def compacted_through(db: Session) -> int:
+    """Highest change sequence whose tombstones may have been compacted away"""
+    return db.scalar(select(SyncState.value).where(SyncState.key == COMPACTED_THROUGH_KEY)) or 0
+
+def resync_marker_key(user_id: int) -> str:
+    """SyncState key of the per-user resync marker"""
+    return f"resync_before:{user_id}"
+
+def mark_resync_required(db: Session, user_id: int):
+    """Force a full resync for all of user_id's cursors issued so far"""
+    _set_state(db, resync_marker_key(user_id), next_change_seq(db, user_id))
+
+def resync_required_before(db: Session, user_id: int) -> int:
+    """Cursors below this value must fully resync"""
+    marker = db.scalar(select(SyncState.value).where(SyncState.key == resync_marker_key(user_id))) or 0
+    return max(compacted_through(db), marker)
+
+def compact_tombstones(
+    db: Session,
+    older_than_days: int = TOMBSTONE_RETENTION_DAYS,
+    batch_size: int = TOMBSTONE_COMPACT_BATCH_SIZE
+) -> int:
+    """Delete expired tombstones in batches, advancing the resync watermark first"""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    removed = 0
+    while True:
+        rows = db.execute(
+            select(TaskTombstone.task_id, TaskTombstone.change_seq)
+            .where(TaskTombstone.deleted_at < cutoff)
+            .order_by(TaskTombstone.change_seq)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return removed
+        
+        watermark = max(compacted_through(db), max(row.change_seq for row in rows))
+        _set_state(db, COMPACTED_THROUGH_KEY, watermark)
+        db.execute(delete(TaskTombstone).where(TaskTombstone.task_id.in_([row.task_id for row in rows])))
+        db.commit()
+        removed += len(rows)
+
+@job_handler("compact_tombstones", concurrency=1, interval=TOMBSTONE_COMPACT_INTERVAL_SECONDS)
+def compact_tombstones_job(db: Session, _payload: Dict[str, Any]):
+    """Recurring background job compacting expired tombstones on every shard"""
+    for _shard_id in for_each_shard(db):
+        compact_tombstones(db)
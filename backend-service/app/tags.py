@@ -0,0 +1,111 @@
+"""
+Task tags: a many-to-many link table with denormalized per-tag counts
+"""
+from collections import Counter
+from typing import Dict, Iterable, List
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from .models import Tag, TaskTag
+
+# Longest tag name accepted, matching Tag.name
+MAX_TAG_LENGTH = 50
+
+def normalize_tag_names(names: Iterable[str]) -> List[str]:
+    """Trimmed, lower-cased, de-duplicated tag names in their given order"""
+    return list(dict.fromkeys(name.strip().lower() for name in names if name.strip()))
+
+def tagged_task_ids(user_id: int, names: List[str], match_all: bool = True):
+    """
+    SELECT of the ids of tasks carrying all (or any) of the user's named tags.
+    
+    Resolves the names through the (user_id, name) unique index and walks
+    task_tags by its (tag_id, task_id) index, so it can be used as an IN
+    subquery of the task list without a separate round trip.
+    """
+    stmt = (
+        select(TaskTag.task_id)
+        .join(Tag, Tag.id == TaskTag.tag_id)
+        .where(Tag.user_id == user_id, Tag.name.in_(names))
+    )
+    if match_all and len(names) > 1:
+        stmt = stmt.group_by(TaskTag.task_id).having(func.count() == len(names))
+    return stmt
+
+def ensure_tags(db: Session, user_id: int, names: List[str]) -> Dict[str, int]:
+    """Ids of the user's tags by name, creating the missing ones"""
+    tag_ids = dict(db.execute(
+        select(Tag.name, Tag.id).where(Tag.user_id == user_id, Tag.name.in_(names))
+    ).all())
+    missing = [name for name in names if name not in tag_ids]
+    if missing:
+        created = db.execute(
+            insert(Tag).returning(Tag.name, Tag.id),
+            [{"user_id": user_id, "name": name} for name in missing]
+        ).all()
+        tag_ids.update(created)
+    return tag_ids
+
+def _adjust_counts(db: Session, tag_ids: Iterable[int], sign: int):
+    """Add sign * occurrences to each tag's task_count, in one executemany"""
+    counts = Counter(tag_ids)
+    if counts:
+        db.execute(
+            update(Tag.__table__)
+            .where(Tag.__table__.c.id == bindparam("tag_id"))
+            .values(task_count=Tag.__table__.c.task_count + bindparam("delta")),
+            [{"tag_id": tag_id, "delta": sign * count} for tag_id, count in counts.items()]
+        )
+
+def tag_tasks(db: Session, user_id: int, task_ids: List[int], names: List[str]) -> int:
+    """Attach tags to tasks, skipping links that already exist; returns links added"""
+    tag_ids = list(ensure_tags(db, user_id, names).values())
+    existing = set(db.execute(
+        select(TaskTag.task_id, TaskTag.tag_id)
+        .where(TaskTag.tag_id.in_(tag_ids), TaskTag.task_id.in_(task_ids))
+    ).all())
+    links = [
+        {"task_id": task_id, "tag_id": tag_id}
+        for task_id in task_ids for tag_id in tag_ids
+        if (task_id, tag_id) not in existing
+    ]
+    if links:
+        db.execute(insert(TaskTag), links)
+        _adjust_counts(db, [link["tag_id"] for link in links], 1)
+    return len(links)
+
+def untag_tasks(db: Session, user_id: int, task_ids: List[int], names: List[str]) -> int:
+    """Detach the user's named tags from tasks; returns links removed"""
+    removed = db.scalars(
+        delete(TaskTag)
+        .where(
+            TaskTag.tag_id.in_(select(Tag.id).where(Tag.user_id == user_id, Tag.name.in_(names))),
+            TaskTag.task_id.in_(task_ids)
+        )
+        .returning(TaskTag.tag_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _adjust_counts(db, removed, -1)
+    return len(removed)
+
+def drop_task_tags(db: Session, task_ids: List[int]):
+    """Remove every tag link of deleted tasks and update the tag counts"""
+    removed = db.scalars(
+        delete(TaskTag)
+        .where(TaskTag.task_id.in_(task_ids))
+        .returning(TaskTag.tag_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _adjust_counts(db, removed, -1)
+
+def task_tag_names(db: Session, task_ids: List[int]) -> Dict[int, List[str]]:
+    """Tag names of each task, alphabetically, from one query"""
+    rows = db.execute(
+        select(TaskTag.task_id, Tag.name)
+        .join(Tag, Tag.id == TaskTag.tag_id)
+        .where(TaskTag.task_id.in_(task_ids))
+        .order_by(TaskTag.task_id, Tag.name)
+    ).all()
+    names: Dict[int, List[str]] = {task_id: [] for task_id in task_ids}
+    for task_id, name in rows:
+        names[task_id].append(name)
+    return names
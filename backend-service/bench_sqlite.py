@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+SQLite throughput benchmark for TaskFlow
+Runs the same concurrent read/write task workload against the original
+setup (every session on one shared StaticPool connection), the classic
+rollback journal (SQLITE_MODE=rollback) and the default WAL reader/writer
+setup
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, func, insert, update
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, RoutingSession, ShardMap, create_db_engine, create_read_engine
+from app.models import Task, TaskPriority, TaskStatus, User
+
+# Baseline first: the single shared connection the app used before pooling
+MODES = ("shared", "rollback", "wal")
+
+
+def seed(engine, users: int, tasks_per_user: int):
+    """Create users with a page-sized backlog of tasks each"""
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com", "hashed_password": "x"}
+            for user_id in range(1, users + 1)
+        ])
+        conn.execute(insert(Task), [
+            {
+                "title": f"Task {i}",
+                "status": random.choice(list(TaskStatus)),
+                "priority": random.choice(list(TaskPriority)),
+                "assigned_user_id": user_id,
+            }
+            for user_id in range(1, users + 1)
+            for i in range(tasks_per_user)
+        ])
+
+def worker(shard_map, users, write_ratio, deadline, counts, lock):
+    """Issue task list reads and task updates until the deadline"""
+    rng = random.Random()
+    reads = writes = errors = 0
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, users)
+        db = RoutingSession(shard_map=shard_map)
+        try:
+            if rng.random() < write_ratio:
+                db.execute(
+                    update(Task)
+                    .where(Task.id == db.query(func.min(Task.id)).filter(Task.assigned_user_id == user_id).scalar_subquery())
+                    .values(title=f"Edited {rng.random()}", version=Task.version + 1)
+                )
+                db.commit()
+                writes += 1
+            else:
+                query = db.query(Task).filter(Task.assigned_user_id == user_id)
+                query.with_entities(func.count(Task.id)).scalar()
+                query.order_by(Task.created_at.desc()).limit(20).all()
+                reads += 1
+        except Exception:
+            errors += 1
+        finally:
+            try:
+                db.close()
+            except Exception:
+                # The shared connection can be left unusable by interleaved threads
+                errors += 1
+    with lock:
+        counts["reads"] += reads
+        counts["writes"] += writes
+        counts["errors"] += errors
+
+def create_engines(url: str, mode: str):
+    """Writer and reader engines for a mode; "shared" is the pre-pooling baseline"""
+    if mode == "shared":
+        engine = create_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+        return engine, engine
+    writer = create_db_engine(url, mode=mode)
+    return writer, create_read_engine(url, writer, mode=mode)
+
+def run(mode: str, args) -> dict:
+    """Benchmark one connection mode on a fresh database file"""
+    directory = tempfile.mkdtemp(prefix="taskflow-bench-")
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    writer, reader = create_engines(url, mode)
+    Base.metadata.create_all(bind=writer)
+    seed(writer, args.users, args.tasks_per_user)
+    shard_map = ShardMap([url], [writer], [reader])
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(shard_map, args.users, args.write_ratio, deadline, counts, lock))
+        for _ in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.dispose()
+    reader.dispose()
+    counts["ops_per_second"] = (counts["reads"] + counts["writes"]) / args.seconds
+    return counts
+
+def main():
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description="Compare SQLite connection modes")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks-per-user", type=int, default=50)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--mode", choices=MODES, help="Run a single mode and print JSON")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run(args.mode, args)))
+        return
+
+    print(f"{args.threads} threads, {args.seconds:g}s, {args.write_ratio:.0%} writes")
+    for mode in MODES:
+        # Each mode runs in its own process: none inherits another's page
+        # cache or file handles, and concurrent use of the shared connection
+        # can crash the interpreter outright
+        proc = subprocess.run(
+            [sys.executable, __file__, "--mode", mode] + sys.argv[1:],
+            capture_output=True, text=True, check=False
+        )
+        if proc.returncode != 0:
+            print(f"{mode:>8}: crashed (exit code {proc.returncode})")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:>8}: {result['ops_per_second']:8.0f} ops/s "
+            f"({result['reads']} reads, {result['writes']} writes, {result['errors']} errors)"
+        )
+
+if __name__ == "__main__":
+    main()
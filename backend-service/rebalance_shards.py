@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Shard rebalancing script for TaskFlow
+Moves users (with their tasks and history) to their home shard under a new
+DATABASE_SHARDS list, e.g. after adding a shard
+"""
+import argparse
+import sys
+
+from app.database import ShardMap
+from app.sharding import REBALANCE_BATCH_SIZE, rebalance
+
+
+def parse_urls(value: str):
+    """Split a comma-separated shard list"""
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+def main():
+    """Run the rebalance from the command line"""
+    parser = argparse.ArgumentParser(description="Move users between TaskFlow shards")
+    parser.add_argument("--from", dest="current", required=True, help="Current comma-separated DATABASE_SHARDS")
+    parser.add_argument("--to", dest="target", required=True, help="New comma-separated DATABASE_SHARDS")
+    parser.add_argument("--batch-size", type=int, default=REBALANCE_BATCH_SIZE, help="Tasks read and inserted per statement")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the users that would move")
+    args = parser.parse_args()
+
+    try:
+        moves = rebalance(
+            ShardMap(parse_urls(args.current)),
+            ShardMap(parse_urls(args.target)),
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    except Exception as e:
+        print(f"Error rebalancing shards: {e}")
+        sys.exit(1)
+
+    for user_id, tasks in moves.items():
+        print(f"user {user_id}: {'would move' if args.dry_run else f'moved {tasks} tasks'}")
+    print(f"{len(moves)} users {'to move' if args.dry_run else 'moved'}")
+    if moves and not args.dry_run:
+        print("Deploy the new DATABASE_SHARDS list before serving traffic again.")
+
+if __name__ == "__main__":
+    main()
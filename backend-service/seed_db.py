@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for TaskFlow
+Loads users and tasks with realistic distributions for capacity testing,
+e.g. to evaluate index and query changes at production scale
+"""
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+
+from app.database import Base, ShardMap, shard_map
+from app.seeding import SEED_CHUNK_SIZE, seed_database
+
+
+def main():
+    """Run the generator from the command line"""
+    parser = argparse.ArgumentParser(description="Seed TaskFlow with synthetic users and tasks")
+    parser.add_argument("--users", type=int, default=1000, help="Users to create")
+    parser.add_argument("--tasks", type=int, default=100000, help="Tasks to create")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed; same seed, same data")
+    parser.add_argument("--as-of", type=datetime.fromisoformat, help="Reference time for timestamps (default: today 00:00 UTC)")
+    parser.add_argument("--history-days", type=int, default=365, help="How far back tasks were created")
+    parser.add_argument("--password", default="password", help="Password shared by all generated users")
+    parser.add_argument("--prefix", default="user", help="Username prefix")
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--shards", help="Comma-separated database URLs (default: DATABASE_SHARDS / DATABASE_URL)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    shards = ShardMap([url.strip() for url in args.shards.split(",") if url.strip()]) if args.shards else shard_map
+    for engine in shards.engines:
+        Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    try:
+        result = seed_database(
+            shards,
+            users=args.users,
+            tasks=args.tasks,
+            seed=args.seed,
+            as_of=args.as_of,
+            history_days=args.history_days,
+            password=args.password,
+            prefix=args.prefix,
+            chunk_size=args.chunk_size,
+        )
+    except Exception as e:
+        print(f"Error seeding database: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+    rows = result["users"] + result["tasks"]
+    print(f"Created {result['users']} users (from id {result['first_user_id']}) and {result['tasks']} tasks")
+    print(f"{rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
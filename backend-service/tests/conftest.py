@@ -0,0 +1,212 @@
+"""
+Shared test fixtures
+
+Every test runs inside one outer transaction on a per-process database that
+is rolled back afterwards. Sessions created by the app (request sessions, the
+audit writer) join that transaction through SAVEPOINTs, so their commits are
+visible to the rest of the test but never persist. Each pytest-xdist worker
+is its own process and gets its own database.
+"""
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Keep the app's own engine off the working directory's taskflow.db
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.audit import audit_log
+from app.auth import create_access_token, get_password_hash
+from app.cache import task_list_cache
+from app.database import Base, ShardMap, create_db_engine, create_read_engine, engine_url, get_db
+from app.models import Task, TaskPriority, TaskStatus, User
+from app.sync import advance_change_seq, current_change_seq
+
+# Database URL for tests; "{worker}" is replaced with the xdist worker id
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite://")
+
+TEST_PASSWORD = "testpassword"
+
+@lru_cache(maxsize=None)
+def password_hash(password: str) -> str:
+    """Hash each test password once; pbkdf2_sha256 is deliberately slow"""
+    return get_password_hash(password)
+
+@pytest.fixture(scope="session")
+def engine():
+    """Database engine shared by all tests in this process"""
+    url = TEST_DATABASE_URL.format(worker=os.getenv("PYTEST_XDIST_WORKER", "main"))
+    if url.startswith("sqlite"):
+        test_engine = create_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+
+        # pysqlite's own transaction handling breaks SAVEPOINT; let SQLAlchemy emit BEGIN
+        @event.listens_for(test_engine, "connect")
+        def _on_connect(dbapi_connection, _record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(test_engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql("BEGIN")
+    else:
+        test_engine = create_engine(engine_url(url))
+    Base.metadata.drop_all(bind=test_engine)
+    Base.metadata.create_all(bind=test_engine)
+    yield test_engine
+    Base.metadata.drop_all(bind=test_engine)
+    test_engine.dispose()
+
+@pytest.fixture
+def connection(engine):
+    """Connection holding the test's outer transaction, rolled back at the end"""
+    conn = engine.connect()
+    transaction = conn.begin()
+    yield conn
+    transaction.rollback()
+    conn.close()
+
+@pytest.fixture
+def session_factory(connection):
+    """Session factory joined to the test transaction, installed in the app"""
+    factory = sessionmaker(
+        bind=connection,
+        autocommit=False,
+        autoflush=False,
+        join_transaction_mode="create_savepoint"
+    )
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous_factory = audit_log.session_factory
+    app.dependency_overrides[get_db] = override_get_db
+    audit_log.session_factory = factory
+    audit_log.clear()
+    if task_list_cache is not None:
+        task_list_cache.clear()
+    yield factory
+    audit_log.clear()
+    if task_list_cache is not None:
+        task_list_cache.clear()
+    audit_log.session_factory = previous_factory
+    app.dependency_overrides.pop(get_db, None)
+
+@pytest.fixture
+def db(session_factory):
+    """A session for arranging and inspecting test data"""
+    session = session_factory()
+    yield session
+    session.close()
+
+@pytest.fixture
+def client(session_factory):
+    """API client talking to the test database"""
+    return TestClient(app)
+
+@pytest.fixture
+def file_shards(tmp_path):
+    """
+    Factory for shard maps over SQLite files in tmp_path, with tables created.
+
+    Unlike the shared test database these have pooled connections, for
+    code that needs real concurrency or more than one database. Every
+    engine is disposed when the test ends.
+    """
+    engines = []
+
+    def make(name: str = "shard", count: int = 1, mode: Optional[str] = None) -> ShardMap:
+        urls = [f"sqlite:///{tmp_path}/{name}{index}.db" for index in range(count)]
+        options = {"mode": mode} if mode else {}
+        writers = [create_db_engine(url, **options) for url in urls]
+        readers = [create_read_engine(url, writer, **options) for url, writer in zip(urls, writers)]
+        engines.extend(writers + readers)
+        for writer in writers:
+            Base.metadata.create_all(bind=writer)
+        return ShardMap(urls, writers, readers)
+
+    yield make
+    for shard_engine in engines:
+        shard_engine.dispose()
+
+@pytest.fixture
+def count_queries(engine):
+    """Context manager collecting the SQL statements sent to the test database"""
+    @contextmanager
+    def counter():
+        statements = []
+        def before_cursor_execute(_conn, _cursor, statement, *_args):
+            statements.append(statement)
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return counter
+
+class Seeder:
+    """Bulk-insert users and tasks directly, bypassing the API"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def user(self, username: str = "testuser", password: str = TEST_PASSWORD, email: Optional[str] = None) -> User:
+        """Create one user"""
+        user = User(username=username, email=email or f"{username}@example.com", hashed_password=password_hash(password))
+        self.db.add(user)
+        self.db.commit()
+        return user
+
+    def users(self, count: int, prefix: str = "user") -> List[int]:
+        """Create count users sharing one password hash; returns their ids"""
+        ids = self.db.scalars(insert(User).returning(User.id), [
+            {"username": f"{prefix}{i}", "email": f"{prefix}{i}@example.com", "hashed_password": password_hash(TEST_PASSWORD)}
+            for i in range(count)
+        ]).all()
+        self.db.commit()
+        return list(ids)
+
+    def tasks(self, user_id: int, count: int, **fields) -> List[int]:
+        """Create count tasks for a user in one executemany; returns their ids"""
+        statuses, priorities = list(TaskStatus), list(TaskPriority)
+        start = current_change_seq(self.db)
+        advance_change_seq(self.db, start + count)
+        rows: List[Dict] = [
+            {
+                "title": f"Task {i}",
+                "status": statuses[i % len(statuses)],
+                "priority": priorities[i % len(priorities)],
+                "assigned_user_id": user_id,
+                "change_seq": start + i + 1,
+                **fields,
+            }
+            for i in range(count)
+        ]
+        ids = self.db.scalars(insert(Task).returning(Task.id), rows).all()
+        self.db.commit()
+        return list(ids)
+
+@pytest.fixture
+def seed(db):
+    """Seeder bound to the test transaction"""
+    return Seeder(db)
+
+@pytest.fixture
+def test_user(seed):
+    """Create a test user"""
+    user = seed.user()
+    return {"id": user.id, "username": user.username, "email": user.email}
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Get authentication headers for test user"""
+    token = create_access_token({"sub": test_user["username"], "uid": test_user["id"]})
+    return {"Authorization": f"Bearer {token}"}
@@ -1,73 +1,39 @@
 """
 Unit tests for TaskFlow API
 """
+import re
+from datetime import datetime
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.main import app
-from app.database import get_db, Base
-
-# Test database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
-
-# Create test client
-client = TestClient(app)
-
-@pytest.fixture(scope="function")
-def test_db():
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
-
-@pytest.fixture
-def test_user(test_db):
-    """Create a test user"""
-    user_data = {
-        "username": "testuser",
-        "email": "test@example.com",
-        "password": "testpassword"
-    }
-    response = client.post("/api/auth/signup", json=user_data)
-    if response.status_code != 200:
-        raise Exception(f"Failed to create test user: {response.text}")
-    return response.json()
+from app.archive import archive_completed_tasks
+from app.audit import audit_log
+from app.cache import task_list_cache
+from app.jobs import enqueue
+from app.models import Task, TaskClosure, TaskTombstone
+from app.sync import compact_tombstones
 
-@pytest.fixture
-def auth_headers(test_user):
-    """Get authentication headers for test user"""
-    login_data = {
-        "username": "testuser",
-        "password": "testpassword"
-    }
-    response = client.post("/api/auth/login", json=login_data)
-    token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
+def request_statements(statements):
+    """Every statement a request ran, as "VERB table", minus the test harness's savepoints"""
+    shapes = []
+    for statement in statements:
+        if statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            continue
+        table = re.search(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", statement).group(1)
+        shapes.append(f"{statement.split()[0]} {table}")
+    return shapes
 
-def test_root_endpoint():
+def test_root_endpoint(client):
     """Test root endpoint"""
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "TaskFlow API is running"}
 
-def test_health_check():
+def test_health_check(client):
     """Test health check endpoint"""
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
 
-def test_user_signup(test_db):
+def test_user_signup(client):
     """Test user registration"""
     user_data = {
         "username": "newuser",
@@ -81,7 +47,7 @@ def test_user_signup(test_db):
     assert data["email"] == "newuser@example.com"
     assert "id" in data
 
-def test_user_login(test_user):
+def test_user_login(test_user, client):
     """Test user login"""
     login_data = {
         "username": "testuser",
@@ -93,14 +59,14 @@ def test_user_login(test_user):
     assert "access_token" in data
     assert data["token_type"] == "bearer"
 
-def test_get_current_user(auth_headers):
+def test_get_current_user(auth_headers, client):
     """Test getting current user info"""
     response = client.get("/api/users/me", headers=auth_headers)
     assert response.status_code == 200
     data = response.json()
     assert data["username"] == "testuser"
 
-def test_create_task(auth_headers):
+def test_create_task(auth_headers, client):
     """Test creating a task"""
     task_data = {
         "title": "Test Task",
@@ -115,7 +81,71 @@ def test_create_task(auth_headers):
     assert data["title"] == "Test Task"
     assert data["status"] == "pending"
 
-def test_get_tasks(auth_headers):
+def test_create_task_single_round_trip(auth_headers, client, count_queries):
+    """Test creation is one INSERT ... RETURNING after the user lookup and change sequence bump"""
+    with count_queries() as statements:
+        response = client.post("/api/tasks", json={"title": "Counted"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    assert response.json()["assigned_user"]["username"] == "testuser"
+    # The sync_state row is created by the first change only
+    assert request_statements(statements) == ["SELECT users", "UPDATE sync_state", "INSERT sync_state", "INSERT tasks"]
+    assert "RETURNING" in statements[-2]
+
+def test_update_task(auth_headers, client, count_queries):
+    """Test an update is one UPDATE ... RETURNING after the user lookup and change sequence bump"""
+    task_id = client.post("/api/tasks", json={"title": "Old"}, headers=auth_headers).json()["id"]
+    with count_queries() as statements:
+        response = client.put(f"/api/tasks/{task_id}", json={"title": "New"}, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["title"] == "New"
+    assert data["version"] == 2
+    assert request_statements(statements) == ["SELECT users", "UPDATE sync_state", "UPDATE tasks"]
+
+def test_update_task_version_conflict(auth_headers, client):
+    """Test a stale version is rejected with 409"""
+    task_id = client.post("/api/tasks", json={"title": "Shared"}, headers=auth_headers).json()["id"]
+    response = client.put(f"/api/tasks/{task_id}", json={"status": "in_progress", "version": 1}, headers=auth_headers)
+    assert response.status_code == 200
+    response = client.put(f"/api/tasks/{task_id}", json={"status": "completed", "version": 1}, headers=auth_headers)
+    assert response.status_code == 409
+    response = client.get(f"/api/tasks/{task_id}", headers=auth_headers)
+    assert response.json()["status"] == "in_progress"
+
+def test_empty_update_writes_nothing(auth_headers, client, count_queries):
+    """Test an update without changes returns the task without bumping its version"""
+    task = client.post("/api/tasks", json={"title": "Unchanged"}, headers=auth_headers).json()
+    cursor = client.get("/api/tasks/changes", headers=auth_headers).json()["cursor"]
+    with count_queries() as statements:
+        response = client.put(f"/api/tasks/{task['id']}", json={}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    assert response.json()["updated_at"] == task["updated_at"]
+    assert request_statements(statements) == ["SELECT users", "SELECT tasks"]
+    
+    assert client.put(f"/api/tasks/{task['id']}", json={"version": 1}, headers=auth_headers).status_code == 200
+    assert client.put(f"/api/tasks/{task['id']}", json={"version": 2}, headers=auth_headers).status_code == 409
+    changes = client.get("/api/tasks/changes", params={"since": cursor}, headers=auth_headers).json()
+    assert changes["tasks"] == []
+
+def test_update_missing_task(auth_headers, client):
+    """Test updating an unknown task returns 404, with or without a version"""
+    assert client.put("/api/tasks/999", json={"title": "x"}, headers=auth_headers).status_code == 404
+    assert client.put("/api/tasks/999", json={"version": 1}, headers=auth_headers).status_code == 404
+
+def test_delete_task(auth_headers, client, count_queries):
+    """Test a delete runs the user lookup, one DELETE ... RETURNING and its tag, sequence and tombstone writes"""
+    task_id = client.post("/api/tasks", json={"title": "Doomed"}, headers=auth_headers).json()["id"]
+    with count_queries() as statements:
+        response = client.delete(f"/api/tasks/{task_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert request_statements(statements) == [
+        "SELECT users", "DELETE tasks", "DELETE task_tags", "UPDATE sync_state", "INSERT task_tombstones"
+    ]
+    assert client.delete(f"/api/tasks/{task_id}", headers=auth_headers).status_code == 404
+
+def test_get_tasks(auth_headers, client):
     """Test getting tasks list"""
     response = client.get("/api/tasks", headers=auth_headers)
     assert response.status_code == 200
@@ -123,7 +153,409 @@ def test_get_tasks(auth_headers):
     assert "tasks" in data
     assert "total" in data
 
-def test_unauthorized_access():
+def test_get_tasks_pages_large_dataset(auth_headers, test_user, client, seed):
+    """Test paging and filtering over a bulk-seeded task list"""
+    seed.tasks(test_user["id"], 2000)
+    page = client.get("/api/tasks?skip=1950&limit=100", headers=auth_headers).json()
+    assert page["total"] == 2000
+    assert len(page["tasks"]) == 50
+    assert client.get("/api/tasks?priority=high", headers=auth_headers).json()["total"] == 666
+
+def test_unauthorized_access(client):
     """Test unauthorized access to protected endpoints"""
     response = client.get("/api/users/me")
     assert response.status_code == 401
+
+def test_archive_completed_tasks(auth_headers, client, db):
+    """Test old completed tasks move to the archive and stay queryable"""
+    for title in ("Done long ago", "Done again", "Still open"):
+        client.post("/api/tasks", json={"title": title}, headers=auth_headers)
+    completed = client.put("/api/tasks/1", json={"status": "completed"}, headers=auth_headers).json()
+    assert completed["completed_at"] is not None
+    client.put("/api/tasks/2", json={"status": "completed"}, headers=auth_headers)
+    
+    assert archive_completed_tasks(db, older_than_days=1) == 0
+    db.query(Task).filter(Task.id.in_([1, 2])).update(
+        {Task.completed_at: datetime(2000, 1, 1)}, synchronize_session=False
+    )
+    db.commit()
+    cursor = client.get("/api/tasks/changes", headers=auth_headers).json()["cursor"]
+    assert archive_completed_tasks(db, older_than_days=1, batch_size=1) == 2
+    
+    # Sync clients see archived tasks leave the list
+    changes = client.get("/api/tasks/changes", params={"since": cursor}, headers=auth_headers).json()
+    assert changes["deleted"] == [1, 2]
+    assert changes["tasks"] == []
+    
+    hot = client.get("/api/tasks", headers=auth_headers).json()
+    assert [task["title"] for task in hot["tasks"]] == ["Still open"]
+    assert client.get("/api/tasks/1", headers=auth_headers).status_code == 404
+    
+    everything = client.get("/api/tasks?include_archived=true", headers=auth_headers).json()
+    assert everything["total"] == 3
+    assert [task["id"] for task in everything["tasks"]] == [1, 2, 3]
+    
+    completed = client.get(
+        "/api/tasks?include_archived=true&task_status=completed&limit=1&skip=1", headers=auth_headers
+    ).json()
+    assert completed["total"] == 2
+    assert completed["tasks"][0]["title"] == "Done again"
+
+def test_get_job_status(auth_headers, test_user, client, db):
+    """Test job status is visible to its owner only"""
+    job_id = enqueue(db, "archive_tasks", user_id=test_user["id"]).id
+    other_id = enqueue(db, "archive_tasks").id
+    db.commit()
+    
+    response = client.get(f"/api/jobs/{job_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert client.get(f"/api/jobs/{other_id}", headers=auth_headers).status_code == 404
+
+def test_task_history(auth_headers, client):
+    """Test task changes are logged in batches and paged by event id"""
+    task_id = client.post("/api/tasks", json={"title": "Tracked"}, headers=auth_headers).json()["id"]
+    client.put(f"/api/tasks/{task_id}", json={"title": "Renamed", "priority": "high"}, headers=auth_headers)
+    client.put(f"/api/tasks/{task_id}", json={"status": "completed", "version": 1}, headers=auth_headers)
+    
+    # Buffered events are invisible until the writer flushes them
+    assert client.get(f"/api/tasks/{task_id}/history", headers=auth_headers).json()["events"] == []
+    assert audit_log.flush() == 3
+    
+    page = client.get(f"/api/tasks/{task_id}/history?limit=2", headers=auth_headers).json()
+    assert [(e["action"], e["field"], e["value"]) for e in page["events"]] == [
+        ("created", None, None),
+        ("updated", "title", "Renamed"),
+    ]
+    rest = client.get(
+        f"/api/tasks/{task_id}/history?after={page['next_after']}", headers=auth_headers
+    ).json()
+    assert [(e["field"], e["value"]) for e in rest["events"]] == [("priority", "high")]
+    assert rest["next_after"] is None
+
+def test_task_history_sync_durability(auth_headers, monkeypatch, client):
+    """Test sync durability writes events in the same transaction as the change"""
+    monkeypatch.setattr(audit_log, "durability", "sync")
+    task_id = client.post("/api/tasks", json={"title": "Durable"}, headers=auth_headers).json()["id"]
+    client.delete(f"/api/tasks/{task_id}", headers=auth_headers)
+    
+    events = client.get(f"/api/tasks/{task_id}/history", headers=auth_headers).json()["events"]
+    assert [e["action"] for e in events] == ["created", "deleted"]
+
+@pytest.mark.skipif(task_list_cache is None, reason="task list cache disabled")
+def test_task_list_cache(auth_headers, client, count_queries):
+    """Test repeated list queries are cached and writes invalidate them"""
+    client.post("/api/tasks", json={"title": "First"}, headers=auth_headers)
+    first = client.get("/api/tasks", headers=auth_headers).json()
+    
+    with count_queries() as statements:
+        cached = client.get("/api/tasks", headers=auth_headers).json()
+    assert cached == first
+    assert request_statements(statements) == ["SELECT users"]
+    assert task_list_cache.hits == 1
+    
+    client.post("/api/tasks", json={"title": "Second"}, headers=auth_headers)
+    assert client.get("/api/tasks", headers=auth_headers).json()["total"] == 2
+    assert client.get("/api/tasks?priority=high", headers=auth_headers).json()["total"] == 0
+    
+    metrics = client.get("/metrics").text
+    assert "taskflow_task_cache_hits_total 1" in metrics
+    assert "taskflow_task_cache_hit_ratio" in metrics
+
+def test_batch_shares_user_and_session(auth_headers, client, count_queries):
+    """Test a batch runs ordered operations with one user lookup"""
+    batch = {"operations": [
+        {"op": "get_current_user"},
+        {"op": "create_task", "args": {"title": "Batched", "priority": "high"}},
+        {"op": "update_task", "args": {"task_id": 1, "status": "in_progress"}},
+        {"op": "list_tasks", "args": {"priority": "high"}},
+        {"op": "get_task", "args": {"task_id": 2}},
+    ]}
+    with count_queries() as statements:
+        response = client.post("/api/batch", json=batch, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["status"] for r in data["results"]] == [200, 200, 200, 200, 404]
+    assert data["results"][0]["body"]["username"] == "testuser"
+    assert data["results"][2]["body"]["status"] == "in_progress"
+    assert data["results"][3]["body"]["total"] == 1
+    assert len([s for s in statements if "FROM users" in s]) == 1
+
+def test_atomic_batch_rolls_back_on_failure(auth_headers, client):
+    """Test an atomic batch commits nothing when an operation fails"""
+    client.get("/api/tasks", headers=auth_headers)
+    batch = {"atomic": True, "operations": [
+        {"op": "create_task", "args": {"title": "Never committed"}},
+        {"op": "list_tasks"},
+        {"op": "delete_task", "args": {"task_id": 999}},
+        {"op": "create_task", "args": {"title": "Never run"}},
+    ]}
+    data = client.post("/api/batch", json=batch, headers=auth_headers).json()
+    assert data["committed"] is False
+    assert [r["status"] for r in data["results"]] == [200, 200, 404, 424]
+    # Reads inside the batch see its own uncommitted writes, not the cache
+    assert data["results"][1]["body"]["total"] == 1
+    
+    assert client.get("/api/tasks", headers=auth_headers).json()["total"] == 0
+    assert audit_log.flush() == 0
+
+def test_batch_validates_operation_args(auth_headers, client):
+    """Test invalid operation arguments fail that operation only"""
+    batch = {"operations": [
+        {"op": "get_task", "args": {}},
+        {"op": "create_task", "args": {"title": "Still created"}},
+    ]}
+    data = client.post("/api/batch", json=batch, headers=auth_headers).json()
+    assert [r["status"] for r in data["results"]] == [422, 200]
+    assert client.get("/api/tasks", headers=auth_headers).json()["total"] == 1
+    
+    response = client.post("/api/batch", json={"operations": [{"op": "drop_tables"}]}, headers=auth_headers)
+    assert response.status_code == 422
+
+def test_batch_reports_operation_errors(auth_headers, client):
+    """Test a failing write inside a batch is reported per operation and rolled back"""
+    batch = {"operations": [
+        {"op": "create_task", "args": {"title": "Kept"}},
+        {"op": "update_task", "args": {"task_id": 1, "title": None}},
+        {"op": "get_task", "args": {"task_id": 1}},
+    ]}
+    response = client.post("/api/batch", json=batch, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["status"] for r in data["results"]] == [200, 500, 200]
+    assert data["results"][2]["body"]["title"] == "Kept"
+    assert data["results"][2]["body"]["version"] == 1
+    
+    batch["atomic"] = True
+    batch["operations"][0]["args"]["title"] = "Dropped"
+    batch["operations"][1]["args"]["task_id"] = 2
+    data = client.post("/api/batch", json=batch, headers=auth_headers).json()
+    assert data["committed"] is False
+    assert [r["status"] for r in data["results"]] == [200, 500, 424]
+    assert client.get("/api/tasks", headers=auth_headers).json()["total"] == 1
+
+def test_sparse_fieldsets(auth_headers, client, count_queries):
+    """Test fields narrows both the selected columns and the JSON output"""
+    client.post("/api/tasks", json={"title": "Sparse", "description": "x" * 1000}, headers=auth_headers)
+    
+    with count_queries() as statements:
+        response = client.get("/api/tasks?fields=title,status", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["tasks"] == [{"title": "Sparse", "status": "pending"}]
+    assert request_statements(statements) == ["SELECT users", "SELECT tasks", "SELECT tasks"]
+    assert not any("description" in statement for statement in statements)
+    
+    detail = client.get("/api/tasks/1?fields=id,assigned_user", headers=auth_headers).json()
+    assert detail == {"id": 1, "assigned_user": client.get("/api/users/me", headers=auth_headers).json()}
+    
+    archived = client.get("/api/tasks?include_archived=true&fields=id,priority", headers=auth_headers).json()
+    assert archived["tasks"] == [{"id": 1, "priority": "medium"}]
+    
+    batch = {"operations": [{"op": "get_task", "args": {"task_id": 1, "fields": "version"}}]}
+    assert client.post("/api/batch", json=batch, headers=auth_headers).json()["results"][0]["body"] == {"version": 1}
+
+def test_sparse_fieldsets_reject_unknown_fields(auth_headers, client):
+    """Test fields outside the Task schema are rejected"""
+    response = client.get("/api/tasks?fields=title,hashed_password", headers=auth_headers)
+    assert response.status_code == 400
+    assert "hashed_password" in response.json()["detail"]
+    assert client.get("/api/tasks/1?fields=,", headers=auth_headers).status_code == 400
+
+def test_task_changes_since_cursor(auth_headers, client):
+    """Test delta sync returns creates, updates and deletions after a cursor"""
+    for title in ("A", "B", "C"):
+        client.post("/api/tasks", json={"title": title}, headers=auth_headers)
+    first = client.get("/api/tasks/changes", headers=auth_headers).json()
+    assert [task["title"] for task in first["tasks"]] == ["A", "B", "C"]
+    assert first["deleted"] == []
+    
+    client.put("/api/tasks/1", json={"title": "A2"}, headers=auth_headers)
+    client.delete("/api/tasks/2", headers=auth_headers)
+    page = client.get(f"/api/tasks/changes?since={first['cursor']}&limit=1", headers=auth_headers).json()
+    assert [task["title"] for task in page["tasks"]] == ["A2"]
+    assert page["has_more"] is True
+    
+    rest = client.get(f"/api/tasks/changes?since={page['cursor']}", headers=auth_headers).json()
+    assert rest["tasks"] == []
+    assert rest["deleted"] == [2]
+    assert rest["has_more"] is False
+    
+    idle = client.get(f"/api/tasks/changes?since={rest['cursor']}", headers=auth_headers).json()
+    assert idle == {**idle, "tasks": [], "deleted": [], "cursor": rest["cursor"]}
+    assert client.get("/api/tasks/changes?since=abc", headers=auth_headers).status_code == 400
+
+def test_task_changes_full_resync_after_compaction(auth_headers, client, db):
+    """Test cursors older than compacted tombstones are told to resync"""
+    for title in ("A", "B"):
+        client.post("/api/tasks", json={"title": title}, headers=auth_headers)
+    cursor = client.get("/api/tasks/changes", headers=auth_headers).json()["cursor"]
+    client.delete("/api/tasks/1", headers=auth_headers)
+    client.post("/api/tasks", json={"title": "C"}, headers=auth_headers)
+    
+    db.query(TaskTombstone).update({TaskTombstone.deleted_at: datetime(2000, 1, 1)})
+    db.commit()
+    assert compact_tombstones(db, older_than_days=1) == 1
+    
+    stale = client.get(f"/api/tasks/changes?since={cursor}", headers=auth_headers).json()
+    assert stale["full_resync"] is True
+    fresh = client.get(f"/api/tasks/changes?since={stale['cursor']}", headers=auth_headers).json()
+    assert fresh["full_resync"] is False
+    assert fresh["tasks"] == []
+    
+    # A first sync has nothing to delete locally, so it never needs a resync
+    initial = client.get("/api/tasks/changes?since=0", headers=auth_headers).json()
+    assert [task["title"] for task in initial["tasks"]] == ["B", "C"]
+
+def create_tree(client, auth_headers):
+    """root -> (a -> grandchild, b); returns the task ids by name"""
+    ids = {}
+    for name, parent in (("root", None), ("a", "root"), ("b", "root"), ("grandchild", "a")):
+        task = {"title": name, "parent_id": ids.get(parent)}
+        ids[name] = client.post("/api/tasks", json=task, headers=auth_headers).json()["id"]
+    return ids
+
+def test_subtask_tree_and_progress(auth_headers, client, count_queries):
+    """Test subtrees, ancestors and rolled-up progress come from constant queries"""
+    ids = create_tree(client, auth_headers)
+    for name in ("grandchild", "b"):
+        client.put(f"/api/tasks/{ids[name]}", json={"status": "completed"}, headers=auth_headers)
+    
+    with count_queries() as statements:
+        tree = client.get(f"/api/tasks/{ids['root']}/subtree", headers=auth_headers).json()["tasks"]
+    assert request_statements(statements) == ["SELECT users", "SELECT tasks", "SELECT tasks", "SELECT task_closure"]
+    assert [(t["title"], t["depth"]) for t in tree] == [("root", 0), ("a", 1), ("b", 1), ("grandchild", 2)]
+    progress = {t["title"]: (t["subtasks"], t["completed_subtasks"], t["progress"]) for t in tree}
+    assert progress == {
+        "root": (3, 2, 66.7), "a": (1, 1, 100.0), "b": (0, 0, 100.0), "grandchild": (0, 0, 100.0)
+    }
+    shallow = client.get(f"/api/tasks/{ids['root']}/subtree?max_depth=1", headers=auth_headers).json()
+    assert len(shallow["tasks"]) == 3
+    
+    ancestors = client.get(f"/api/tasks/{ids['grandchild']}/ancestors", headers=auth_headers).json()
+    assert [t["title"] for t in ancestors["tasks"]] == ["root", "a"]
+    assert client.get(f"/api/tasks/{ids['a']}/progress", headers=auth_headers).json() == {
+        "task_id": ids["a"], "subtasks": 1, "completed_subtasks": 1, "progress": 100.0
+    }
+    response = client.post("/api/tasks", json={"title": "orphan", "parent_id": 999}, headers=auth_headers)
+    assert response.status_code == 404
+
+def test_move_subtree(auth_headers, client):
+    """Test moving a task carries its subtasks and rejects cycles"""
+    ids = create_tree(client, auth_headers)
+    moved = client.put(f"/api/tasks/{ids['a']}/parent", json={"parent_id": ids["b"]}, headers=auth_headers)
+    assert moved.status_code == 200
+    assert moved.json()["parent_id"] == ids["b"]
+    assert moved.json()["version"] == 2
+    
+    ancestors = client.get(f"/api/tasks/{ids['grandchild']}/ancestors", headers=auth_headers).json()
+    assert [t["title"] for t in ancestors["tasks"]] == ["root", "b", "a"]
+    tree = client.get(f"/api/tasks/{ids['b']}/subtree", headers=auth_headers).json()["tasks"]
+    assert [(t["title"], t["depth"]) for t in tree] == [("b", 0), ("a", 1), ("grandchild", 2)]
+    
+    cycle = client.put(f"/api/tasks/{ids['a']}/parent", json={"parent_id": ids["grandchild"]}, headers=auth_headers)
+    assert cycle.status_code == 400
+    stale = client.put(f"/api/tasks/{ids['a']}/parent", json={"parent_id": None, "version": 1}, headers=auth_headers)
+    assert stale.status_code == 409
+    
+    client.put(f"/api/tasks/{ids['a']}/parent", json={"parent_id": None}, headers=auth_headers)
+    ancestors = client.get(f"/api/tasks/{ids['grandchild']}/ancestors", headers=auth_headers).json()
+    assert [t["title"] for t in ancestors["tasks"]] == ["a"]
+    assert len(client.get(f"/api/tasks/{ids['root']}/subtree", headers=auth_headers).json()["tasks"]) == 2
+
+def test_delete_subtree(auth_headers, client, db):
+    """Test deleting a task removes its subtasks, closure rows included, and syncs them"""
+    ids = create_tree(client, auth_headers)
+    cursor = client.get("/api/tasks/changes", headers=auth_headers).json()["cursor"]
+    assert client.delete(f"/api/tasks/{ids['a']}", headers=auth_headers).status_code == 200
+    
+    assert client.get(f"/api/tasks/{ids['grandchild']}", headers=auth_headers).status_code == 404
+    changes = client.get(f"/api/tasks/changes?since={cursor}", headers=auth_headers).json()
+    assert sorted(changes["deleted"]) == [ids["a"], ids["grandchild"]]
+    assert db.query(TaskClosure).filter(
+        TaskClosure.descendant_id.in_([ids["a"], ids["grandchild"]])
+    ).count() == 0
+    assert client.get(f"/api/tasks/{ids['root']}/progress", headers=auth_headers).json()["subtasks"] == 1
+
+def test_archive_moves_whole_trees(auth_headers, client, db):
+    """Test a task tree is archived in one go, once every task in it is old and completed"""
+    ids = create_tree(client, auth_headers)
+    for name in ("root", "a", "grandchild"):
+        client.put(f"/api/tasks/{ids[name]}", json={"status": "completed"}, headers=auth_headers)
+    db.query(Task).filter(Task.completed_at.isnot(None)).update({Task.completed_at: datetime(2000, 1, 1)}, synchronize_session=False)
+    db.commit()
+    
+    # b is still open, so nothing under root moves
+    assert archive_completed_tasks(db, older_than_days=1) == 0
+    
+    client.put(f"/api/tasks/{ids['b']}", json={"status": "completed"}, headers=auth_headers)
+    assert archive_completed_tasks(db, older_than_days=1) == 0
+    db.query(Task).filter(Task.completed_at.isnot(None)).update({Task.completed_at: datetime(2000, 1, 1)}, synchronize_session=False)
+    db.commit()
+    assert archive_completed_tasks(db, older_than_days=1, max_batches=1) == 4
+    assert db.query(TaskClosure).count() == 0
+    archived = client.get("/api/tasks?include_archived=true", headers=auth_headers).json()["tasks"]
+    assert {task["title"]: task["parent_id"] for task in archived} == {
+        "root": None, "a": ids["root"], "b": ids["root"], "grandchild": ids["a"]
+    }
+
+def test_archive_keeps_subtasks_of_open_parent(auth_headers, client, db):
+    """Test completed subtasks of an open task stay hot, in its progress and its deletes"""
+    parent = client.post("/api/tasks", json={"title": "parent"}, headers=auth_headers).json()["id"]
+    for title in ("done", "open"):
+        client.post("/api/tasks", json={"title": title, "parent_id": parent}, headers=auth_headers)
+    client.put(f"/api/tasks/{parent + 1}", json={"status": "completed"}, headers=auth_headers)
+    db.query(Task).filter(Task.completed_at.isnot(None)).update({Task.completed_at: datetime(2000, 1, 1)}, synchronize_session=False)
+    db.commit()
+    
+    assert archive_completed_tasks(db, older_than_days=1) == 0
+    assert client.get(f"/api/tasks/{parent}/progress", headers=auth_headers).json()["progress"] == 50.0
+    
+    assert client.delete(f"/api/tasks/{parent}", headers=auth_headers).status_code == 200
+    assert client.get("/api/tasks?include_archived=true", headers=auth_headers).json()["total"] == 0
+
+def test_filter_tasks_by_tags(auth_headers, test_user, client, seed, count_queries):
+    """Test tag filters match all or any of the tags inside the list query"""
+    task_ids = seed.tasks(test_user["id"], 4)
+    for tags, ids in ((["Urgent", "backend"], task_ids[:2]), (["urgent"], task_ids[2:3])):
+        response = client.post("/api/tags/apply", json={"task_ids": ids, "tags": tags}, headers=auth_headers)
+        assert response.status_code == 200
+    # Re-applying an existing tag adds nothing
+    response = client.post("/api/tags/apply", json={"task_ids": task_ids[:1], "tags": ["urgent"]}, headers=auth_headers)
+    assert response.json() == {"changed": 0}
+    
+    def listed(query):
+        tasks = client.get(f"/api/tasks?{query}", headers=auth_headers).json()["tasks"]
+        return sorted(task["id"] for task in tasks)
+    
+    with count_queries() as statements:
+        assert listed("tags=urgent,backend") == task_ids[:2]
+    assert request_statements(statements) == ["SELECT users", "SELECT tasks", "SELECT tasks"]
+    assert listed("tags=backend,URGENT&match=any") == task_ids[:3]
+    assert listed("tags=urgent&include_archived=true") == task_ids[:3]
+    assert listed("tags=unknown") == []
+    assert client.get("/api/tasks?tags=,", headers=auth_headers).status_code == 400
+    
+    tags = client.get("/api/tags", headers=auth_headers).json()["tags"]
+    assert tags == [{"name": "backend", "task_count": 2}, {"name": "urgent", "task_count": 3}]
+    assert client.get(f"/api/tasks/{task_ids[0]}/tags", headers=auth_headers).json()["tags"] == ["backend", "urgent"]
+
+def test_untag_and_delete_update_tag_counts(auth_headers, test_user, client, seed):
+    """Test removing tags and deleting tasks keeps per-tag counts in step"""
+    task_ids = seed.tasks(test_user["id"], 3)
+    client.post("/api/tags/apply", json={"task_ids": task_ids, "tags": ["a", "b"]}, headers=auth_headers)
+    
+    # The cached list must not survive a tag change
+    assert client.get("/api/tasks?tags=a", headers=auth_headers).json()["total"] == 3
+    response = client.post("/api/tags/remove", json={"task_ids": task_ids[:2], "tags": ["a"]}, headers=auth_headers)
+    assert response.json() == {"changed": 2}
+    assert client.get("/api/tasks?tags=a", headers=auth_headers).json()["total"] == 1
+    
+    client.delete(f"/api/tasks/{task_ids[2]}", headers=auth_headers)
+    tags = client.get("/api/tags", headers=auth_headers).json()["tags"]
+    assert tags == [{"name": "b", "task_count": 2}]
+    
+    other = seed.tasks(seed.users(1, prefix="other")[0], 1)
+    response = client.post("/api/tags/apply", json={"task_ids": other, "tags": ["a"]}, headers=auth_headers)
+    assert response.status_code == 404
@@ -0,0 +1,74 @@
+"""
+Unit tests for the batched task change log
+"""
+import asyncio
+import time
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.audit import AuditLog, task_event
+from app.database import RoutingSession
+from app.models import TaskEvent, TaskEventAction, TaskStatus
+
+def test_task_event_stringifies_values():
+    """Test enum and scalar values are stored as text"""
+    event = task_event(1, 2, TaskEventAction.UPDATED, "status", TaskStatus.COMPLETED)
+    assert event["value"] == "completed"
+    assert task_event(1, 2, TaskEventAction.CREATED)["value"] is None
+
+def test_full_buffer_drops_overflow(session_factory, db):
+    """Test the buffer never grows past its cap and never flushes on the caller"""
+    log = AuditLog(session_factory, max_buffered=3)
+    log.add([task_event(1, 1, TaskEventAction.CREATED)] * 2)
+    log.add([task_event(1, 1, TaskEventAction.DELETED)] * 2)
+    assert db.query(TaskEvent).count() == 0
+    assert log.dropped == 1
+    assert log.flush() == 3
+
+def test_full_batch_wakes_flusher(file_shards):
+    """Test a full batch is written by the background task on its own connection"""
+    session_factory = sessionmaker(class_=RoutingSession, shard_map=file_shards("audit"))
+    log = AuditLog(session_factory, batch_size=2)
+    
+    def stored():
+        with session_factory() as db:
+            return db.query(TaskEvent).count()
+    
+    async def run():
+        flusher = asyncio.create_task(log.run(interval=60))
+        await asyncio.sleep(0.01)
+        await asyncio.to_thread(log.add, [task_event(1, 1, TaskEventAction.CREATED)] * 2)
+        deadline = time.monotonic() + 5
+        while stored() < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        flusher.cancel()
+    
+    asyncio.run(run())
+    assert stored() == 2
+
+def test_flusher_refuses_shared_connection(session_factory):
+    """Test the background flusher does not run on a single shared connection"""
+    with pytest.raises(RuntimeError):
+        asyncio.run(AuditLog(session_factory).run())
+
+def test_failed_flush_keeps_events_up_to_cap(session_factory, connection):
+    """Test events survive a failed flush without exceeding the cap"""
+    log = AuditLog(session_factory, max_buffered=10)
+    log.add([task_event(i, 1, TaskEventAction.CREATED) for i in range(4)])
+    missing_table = connection.begin_nested()
+    connection.execute(text("DROP TABLE task_events"))
+    assert log.flush() == 0
+    missing_table.rollback()
+    assert log.flush() == 4
+
+def test_rolled_back_events_are_discarded(session_factory):
+    """Test events staged on a rolled-back session never reach the buffer"""
+    log = AuditLog(session_factory)
+    db = session_factory()
+    try:
+        db.execute(text("SELECT 1"))
+        log.record(db, [task_event(1, 1, TaskEventAction.CREATED)])
+        db.rollback()
+        assert "audit_staged_events" not in db.info
+    finally:
+        db.close()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the task list response cache
+"""
+import time
+from app.cache import MemoryCache, RedisCache, TaskListCache
+
+class LocalRedis:
+    """Stand-in for a Redis server implementing the commands the cache uses"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, time.monotonic() + ex if ex else None)
+    
+    def delete(self, key):
+        self.data.pop(key, None)
+    
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+def test_memory_cache_evicts_least_recently_used():
+    """Test the entry cap evicts the least recently used key"""
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+
+def test_memory_cache_respects_byte_cap():
+    """Test the byte cap bounds the total stored size"""
+    cache = MemoryCache(max_bytes=20)
+    cache.set("a", b"x" * 9)
+    cache.set("b", b"y" * 9)
+    cache.set("c", b"z" * 9)
+    assert cache.size_bytes <= 20
+    assert cache.get("a") is None
+    assert cache.get("c") == b"z" * 9
+
+def test_memory_cache_expires_entries(monkeypatch):
+    """Test entries expire after their TTL"""
+    cache = MemoryCache()
+    now = time.monotonic()
+    cache.set("a", b"1", ttl=10)
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+    assert cache.size_bytes == 0
+
+def check_invalidation(backend):
+    """Invalidation checks shared by the cache backends"""
+    cache = TaskListCache(backend)
+    page = {"skip": 0, "limit": 10, "status": None}
+    cache.set(cache.key(1, page), b"user one")
+    cache.set(cache.key(2, page), b"user two")
+    assert cache.get(cache.key(1, page)) == b"user one"
+    assert cache.get(cache.key(1, {**page, "status": "pending"})) is None
+    
+    cache.invalidate_user(1)
+    assert cache.get(cache.key(1, page)) is None
+    assert cache.get(cache.key(2, page)) == b"user two"
+    assert cache.hit_ratio == 0.5
+
+def test_invalidation_with_memory_backend():
+    """Test a write drops only the writer's cached pages (in-process backend)"""
+    check_invalidation(MemoryCache())
+
+def test_invalidation_with_redis_backend():
+    """Test a write drops only the writer's cached pages (shared backend)"""
+    server = LocalRedis()
+    check_invalidation(RedisCache(server))
+    assert all(key.startswith("taskflow:") for key in server.data)
+    
+    RedisCache(server).clear()
+    assert server.data == {}
+
+def test_page_computed_during_write_is_not_served():
+    """Test a page stored after a concurrent invalidation stays unreachable"""
+    cache = TaskListCache(MemoryCache())
+    page = {"skip": 0, "limit": 10}
+    key = cache.key(1, page)
+    # A write commits while the page is being read from the database
+    cache.invalidate_user(1)
+    cache.set(key, b"stale page")
+    assert cache.get(cache.key(1, page)) is None
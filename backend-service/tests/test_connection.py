@@ -2,9 +2,17 @@
 """
 Test connection between frontend and backend
 """
+import os
+import pytest
 import requests
 import time
 
+# These talk to running servers over the network; opt in explicitly
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_INTEGRATION_TESTS") != "1",
+    reason="needs running backend servers; set RUN_INTEGRATION_TESTS=1"
+)
+
 def test_backend_connection():
     """Test if backend is accessible"""
     print("Testing backend connection...")
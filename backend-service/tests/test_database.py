@@ -0,0 +1,122 @@
+"""
+Unit tests for the SQLite connection modes
+"""
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+from app import database
+from app.auth import create_access_token
+from app.database import RoutingSession, create_db_engine, create_read_engine, engine_url, get_db
+from app.main import app
+from app.models import User
+
+@pytest.fixture
+def wal_map(file_shards):
+    """A one-shard map over a WAL-mode SQLite file"""
+    return file_shards("wal", mode="wal")
+
+def make_user(name):
+    """An unsaved user with a unique username and email"""
+    return User(username=name, email=f"{name}@example.com", hashed_password="x")
+
+def test_wal_pragmas(wal_map):
+    """Test WAL connections get the journal, sync and read-only pragmas"""
+    with wal_map.engines[0].connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+    with wal_map.readers[0].connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() > 0
+
+def test_connection_pools(tmp_path):
+    """Test the writer and reader pools each SQLite mode gets"""
+    url = f"sqlite:///{tmp_path}/pools.db"
+    writer = create_db_engine(url)
+    reader = create_read_engine(url, writer)
+    try:
+        # File databases default to WAL with pooled connections
+        assert isinstance(writer.pool, QueuePool)
+        assert isinstance(reader.pool, QueuePool) and reader is not writer
+        with writer.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    finally:
+        writer.dispose()
+        reader.dispose()
+
+    rollback = create_db_engine(url, mode="rollback")
+    assert create_read_engine(url, rollback, mode="rollback") is rollback
+    rollback.dispose()
+    assert isinstance(create_db_engine("sqlite://").pool, StaticPool)
+
+def test_postgres_urls_use_psycopg3():
+    """Test plain PostgreSQL URLs are mapped onto the psycopg 3 driver"""
+    assert engine_url("postgresql://u:p@db/taskflow") == "postgresql+psycopg://u:p@db/taskflow"
+    assert engine_url("postgresql+psycopg2://u:p@db/taskflow") == "postgresql+psycopg2://u:p@db/taskflow"
+    assert engine_url("sqlite:///./taskflow.db") == "sqlite:///./taskflow.db"
+    pytest.importorskip("psycopg")
+    engine = create_db_engine("postgresql://u:p@db/taskflow")
+    assert engine.dialect.driver == "psycopg"
+    assert isinstance(engine.pool, QueuePool)
+
+def test_reads_use_reader_until_transaction_writes(wal_map):
+    """Test reads go to the reader until the transaction writes, then stay on the writer"""
+    writer, reader = wal_map.engines[0], wal_map.readers[0]
+    query = select(User)
+    with RoutingSession(shard_map=wal_map) as db:
+        assert db.get_bind(clause=query) is reader
+        db.add(make_user("alice"))
+        db.flush()
+        # Pinned to the writer, so the transaction sees its own insert
+        assert db.get_bind(clause=query) is writer
+        assert db.scalar(select(User.username)) == "alice"
+        db.commit()
+        assert db.get_bind(clause=query) is reader
+        assert db.scalar(select(User.username)) == "alice"
+
+def test_concurrent_writers_are_serialized(wal_map):
+    """Test threads writing at once all succeed on the single writer connection"""
+    errors = []
+    def write(worker):
+        try:
+            for i in range(20):
+                with RoutingSession(shard_map=wal_map) as db:
+                    db.add(make_user(f"user{worker}_{i}"))
+                    db.commit()
+                    db.scalar(select(func.count(User.id)))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with RoutingSession(shard_map=wal_map) as db:
+        assert db.scalar(select(func.count(User.id))) == 160
+
+def test_writer_wait_returns_503(session_factory, file_shards, monkeypatch):
+    """Test a write that cannot get the writer connection in time is answered with 503"""
+    monkeypatch.setattr(database, "SQLITE_BUSY_TIMEOUT_MS", 100)
+    busy_map = file_shards("busy")
+    writer = busy_map.engines[0]
+    with RoutingSession(shard_map=busy_map) as db:
+        db.add(make_user("alice"))
+        db.commit()
+        user_id = db.scalar(select(User.id))
+    factory = sessionmaker(class_=RoutingSession, shard_map=busy_map)
+    def override_get_db():
+        with factory() as db:
+            yield db
+    app.dependency_overrides[get_db] = override_get_db
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'alice', 'uid': user_id})}"}
+    client = TestClient(app, raise_server_exceptions=False)
+    # Another request in this process holds the single writer connection
+    with writer.connect():
+        response = client.post("/api/tasks", json={"title": "Queued"}, headers=headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.post("/api/tasks", json={"title": "Queued"}, headers=headers).status_code == 200
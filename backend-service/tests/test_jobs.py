@@ -0,0 +1,138 @@
+"""
+Unit tests for the background job runner
+"""
+import asyncio
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app import jobs
+from app.database import RoutingSession
+from app.jobs import JobRunner, enqueue, job_handler
+from app.models import Job, JobStatus
+
+calls = []
+
+@job_handler("test_record")
+def record_job(_db, payload):
+    calls.append(payload["value"])
+
+@job_handler("test_flaky")
+def flaky_job(_db, payload):
+    calls.append("attempt")
+    if len(calls) < payload["succeed_on"]:
+        raise RuntimeError("transient failure")
+
+@job_handler("test_recurring", interval=60)
+def recurring_job(_db, _payload):
+    calls.append("tick")
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Make failed jobs immediately due again"""
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 0)
+
+def enqueue_job(session_factory, name, payload, **kwargs):
+    db = session_factory()
+    try:
+        job_id = enqueue(db, name, payload, **kwargs).id
+        db.commit()
+        return job_id
+    finally:
+        db.close()
+
+def job_status(session_factory, job_id):
+    db = session_factory()
+    try:
+        return db.get(Job, job_id)
+    finally:
+        db.close()
+
+def test_run_pending_executes_due_jobs(session_factory):
+    """Test due jobs run in order and delayed jobs wait"""
+    first = enqueue_job(session_factory, "test_record", {"value": 1})
+    enqueue_job(session_factory, "test_record", {"value": 2})
+    delayed = enqueue_job(session_factory, "test_record", {"value": 3}, delay=3600)
+    
+    assert JobRunner(session_factory).run_pending() == 2
+    assert calls == [1, 2]
+    assert job_status(session_factory, first).status == JobStatus.SUCCEEDED
+    assert job_status(session_factory, delayed).status == JobStatus.PENDING
+
+def test_failed_job_retries_then_succeeds(session_factory, no_backoff):
+    """Test a failing job is retried until it succeeds"""
+    job_id = enqueue_job(session_factory, "test_flaky", {"succeed_on": 2})
+    
+    assert JobRunner(session_factory).run_pending() == 2
+    job = job_status(session_factory, job_id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.attempts == 2
+
+def test_failed_job_gives_up_after_max_attempts(session_factory, no_backoff):
+    """Test a job that keeps failing ends up failed with its error"""
+    job_id = enqueue_job(session_factory, "test_flaky", {"succeed_on": 99}, max_attempts=3)
+    
+    JobRunner(session_factory).run_pending()
+    job = job_status(session_factory, job_id)
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 3
+    assert job.last_error == "transient failure"
+
+def test_failed_job_is_rescheduled_with_backoff(session_factory):
+    """Test a failed attempt pushes the job back instead of retrying immediately"""
+    job_id = enqueue_job(session_factory, "test_flaky", {"succeed_on": 2})
+    
+    assert JobRunner(session_factory).run_pending() == 1
+    job = job_status(session_factory, job_id)
+    assert job.status == JobStatus.PENDING
+    assert job.run_after > job.started_at
+
+def test_recurring_job_is_seeded_and_rescheduled(session_factory):
+    """Test recurring jobs are seeded once on startup and re-enqueued after running"""
+    runner = JobRunner(session_factory)
+    runner.recover()
+    runner.recover()
+    assert runner.run_pending() >= 1
+    assert calls.count("tick") == 1
+    
+    db = session_factory()
+    try:
+        pending = db.query(Job).filter(Job.name == "test_recurring", Job.status == JobStatus.PENDING).all()
+    finally:
+        db.close()
+    assert len(pending) == 1
+
+def test_retry_delay_backs_off():
+    """Test retry delays grow exponentially up to the cap"""
+    assert jobs.retry_delay(1) < jobs.retry_delay(2) < jobs.retry_delay(3)
+    assert jobs.retry_delay(100) == jobs.JOB_RETRY_MAX_SECONDS
+
+@pytest.fixture
+def pooled_db(file_shards, monkeypatch):
+    """Session factory on a WAL database file, where each worker gets its own connection"""
+    monkeypatch.setattr(jobs, "_handlers", {"test_record": jobs._handlers["test_record"]})
+    return sessionmaker(class_=RoutingSession, shard_map=file_shards("jobs"))
+
+def test_workers_refuse_shared_connection(session_factory):
+    """Test threaded workers do not start on a single shared connection"""
+    with pytest.raises(RuntimeError):
+        asyncio.run(JobRunner(session_factory).start())
+
+def test_worker_pool_processes_queue(pooled_db):
+    """Test the asyncio worker pool drains the queue in the background"""
+    job_id = enqueue_job(pooled_db, "test_record", {"value": "async"})
+    
+    async def run():
+        runner = JobRunner(pooled_db, workers=2, poll_interval=0.01)
+        await runner.start()
+        for _ in range(200):
+            if calls:
+                break
+            await asyncio.sleep(0.01)
+        await runner.stop()
+    
+    asyncio.run(run())
+    assert calls == ["async"]
+    assert job_status(pooled_db, job_id).status == JobStatus.SUCCEEDED
@@ -0,0 +1,102 @@
+"""
+Unit tests for the queued structured logging pipeline
+"""
+import json
+import logging
+import queue
+import sys
+from fastapi.testclient import TestClient
+from app.auth import get_current_user
+from app.logs import (
+    SERVER_LOGGERS, DroppingQueueHandler, JsonFormatter, RequestContext, RequestContextFilter,
+    request_context, route_server_logs
+)
+from app.main import app
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extras():
+    """Test records render as JSON with their extra fields"""
+    line = JsonFormatter().format(make_record(request_id="abc", duration_ms=1.5))
+    entry = json.loads(line)
+    assert entry["message"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "abc"
+    assert entry["duration_ms"] == 1.5
+
+def test_queue_handler_drops_when_full():
+    """Test a full queue drops and counts records instead of blocking"""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.dropped == 1
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "hello world"
+    assert queued.args is None
+
+def test_queue_handler_keeps_traceback():
+    """Test exceptions are rendered before the record leaves the thread"""
+    handler = DroppingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        handler.handle(logging.LogRecord("app.test", logging.ERROR, __file__, 1, "failed", (), sys.exc_info()))
+    entry = json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+    assert "ValueError: boom" in entry["exception"]
+
+def test_info_sampling_is_per_request():
+    """Test unsampled requests drop info records but keep warnings"""
+    log_filter = RequestContextFilter()
+    assert log_filter.filter(make_record())
+    token = request_context.set(RequestContext("req-1", sampled=False))
+    try:
+        assert not log_filter.filter(make_record())
+        warning = make_record(level=logging.WARNING)
+        assert log_filter.filter(warning)
+        assert warning.request_id == "req-1"
+    finally:
+        request_context.reset(token)
+
+def test_request_id_header(client):
+    """Test requests get an id, reusing a well-formed incoming one"""
+    assert client.get("/health", headers={"X-Request-ID": "abc-123"}).headers["X-Request-ID"] == "abc-123"
+    generated = client.get("/health", headers={"X-Request-ID": "bad id\n"}).headers["X-Request-ID"]
+    assert len(generated) == 32
+    assert "taskflow_log_records_dropped_total" in client.get("/metrics").text
+
+def test_uvicorn_logs_go_through_queue(monkeypatch):
+    """Test uvicorn's stream handlers are removed and its access log is dropped"""
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        monkeypatch.setattr(server_logger, "handlers", [logging.StreamHandler(sys.stderr)])
+        monkeypatch.setattr(server_logger, "propagate", False)
+    route_server_logs()
+    for name in ("uvicorn", "uvicorn.error"):
+        assert logging.getLogger(name).handlers == []
+        assert logging.getLogger(name).propagate
+    access = logging.getLogger("uvicorn.access")
+    assert not access.propagate
+    assert [type(handler) for handler in access.handlers] == [logging.NullHandler]
+
+def test_unhandled_exception_log_has_request_id(session_factory):
+    """Test the app-wide exception handler logs the failing request's id"""
+    def broken_user():
+        raise RuntimeError("boom")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logging.getLogger("app.main").addHandler(handler)
+    app.dependency_overrides[get_current_user] = broken_user
+    try:
+        response = TestClient(app, raise_server_exceptions=False).get(
+            "/api/users/me", headers={"X-Request-ID": "req-500"}
+        )
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        logging.getLogger("app.main").removeHandler(handler)
+    assert response.status_code == 500
+    errors = [record for record in records if record.getMessage() == "Unhandled exception: boom"]
+    assert [record.request_id for record in errors] == ["req-500"]
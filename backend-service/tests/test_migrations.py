@@ -0,0 +1,51 @@
+"""
+Tests for upgrading databases created by earlier releases
+"""
+from datetime import datetime
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+from app.database import Base
+from app.migrations import upgrade_schema
+from app.models import Task, TaskStatus
+from app.sync import current_change_seq
+
+# users and tasks as the first release created them
+INITIAL_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL UNIQUE, email VARCHAR(100) NOT NULL UNIQUE,
+        hashed_password VARCHAR(255) NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME
+    )""",
+    """CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, description TEXT,
+        status VARCHAR(11) NOT NULL, priority VARCHAR(6) NOT NULL,
+        assigned_user_id INTEGER NOT NULL REFERENCES users (id),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME
+    )""",
+    "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')",
+    "INSERT INTO tasks (id, title, status, priority, assigned_user_id, updated_at) "
+    "VALUES (1, 'Open', 'PENDING', 'LOW', 1, NULL), (2, 'Done', 'COMPLETED', 'HIGH', 1, '2020-01-02 03:04:05')",
+]
+
+def test_upgrade_adds_columns_to_initial_schema(tmp_path):
+    """Test a first-release database gets the new task columns, indexes and backfills"""
+    engine = create_engine(f"sqlite:///{tmp_path}/old.db")
+    with engine.begin() as conn:
+        for statement in INITIAL_SCHEMA:
+            conn.execute(text(statement))
+    Base.metadata.create_all(bind=engine)
+    
+    assert upgrade_schema(engine) == ["tasks.version", "tasks.completed_at", "tasks.change_seq", "tasks.parent_id"]
+    indexes = {index["name"] for index in inspect(engine).get_indexes("tasks")}
+    assert {"ix_tasks_completed_at", "ix_tasks_parent_id", "ix_tasks_assigned_user_id_change_seq"} <= indexes
+    with Session(engine) as db:
+        open_task, done_task = db.query(Task).order_by(Task.id).all()
+        assert (open_task.version, open_task.completed_at, open_task.change_seq) == (1, None, 1)
+        assert done_task.status == TaskStatus.COMPLETED
+        assert done_task.completed_at == datetime(2020, 1, 2, 3, 4, 5)
+        assert done_task.updated_at == datetime(2020, 1, 2, 3, 4, 5)
+        assert done_task.change_seq == 2
+        assert done_task.parent_id is None
+        assert current_change_seq(db) == 2
+    
+    assert upgrade_schema(engine) == []
+    engine.dispose()
@@ -0,0 +1,110 @@
+"""
+Tests for the event-loop monitor and request profiler
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.profiling import LoopMonitor, ProfilingMiddleware, fold_stack, write_folded
+
+def blocking_handler():
+    time.sleep(0.3)
+
+def test_fold_stack_is_outermost_first():
+    """Test stacks fold into one line ending at the current function"""
+    frames = fold_stack(sys._getframe()).split(";")
+    assert frames[-1].startswith("test_fold_stack_is_outermost_first (test_profiling.py:")
+    assert len(frames) > 1
+
+def test_loop_monitor_reports_blocking_call(caplog):
+    """Test a blocked loop is counted and logged with the blocking stack"""
+    monitor = LoopMonitor(interval_ms=10, threshold_ms=100)
+    
+    async def run():
+        await monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+    
+    with caplog.at_level(logging.WARNING, logger="app.profiling"):
+        asyncio.run(run())
+    assert monitor.blocked == 1
+    assert monitor.max_lag >= 0.2
+    assert "in blocking_handler" in caplog.records[0].getMessage()
+
+def test_write_folded_prunes_old_profiles(tmp_path):
+    """Test profiles use folded-stack lines and only the newest are kept"""
+    for index in range(3):
+        write_folded(str(tmp_path / f"{index}.folded"), Counter({"main;handler": 3, "main": 1}), max_files=2)
+        os.utime(tmp_path / f"{index}.folded", (index, index))
+    assert sorted(os.listdir(tmp_path)) == ["1.folded", "2.folded"]
+    assert (tmp_path / "2.folded").read_text() == "main;handler 3\nmain 1\n"
+
+def test_write_folded_keeps_newest_on_mtime_tie(tmp_path):
+    """Test the cap holds and never removes the profile just written"""
+    for name in ("20260101T000000-a", "20260101T000000-b"):
+        (tmp_path / f"{name}.folded").write_text("old 1\n")
+        os.utime(tmp_path / f"{name}.folded", (100, 100))
+    write_folded(str(tmp_path / "20200101T000000-new.folded"), Counter({"new": 1}), max_files=1)
+    assert os.listdir(tmp_path) == ["20200101T000000-new.folded"]
+
+def test_profile_header_needs_opt_in_and_token(tmp_path):
+    """Test X-Profile is ignored by default and must match the configured token"""
+    app = FastAPI()
+    
+    @app.get("/fast")
+    async def fast():
+        return {}
+    
+    assert "X-Profile-File" not in TestClient(ProfilingMiddleware(app, directory=str(tmp_path))).get(
+        "/fast", headers={"X-Profile": "1"}
+    ).headers
+    client = TestClient(ProfilingMiddleware(app, header_enabled=True, header_token="s3cret", directory=str(tmp_path)))
+    assert "X-Profile-File" not in client.get("/fast", headers={"X-Profile": "1"}).headers
+    assert "X-Profile-File" in client.get("/fast", headers={"X-Profile": "s3cret"}).headers
+
+def test_profile_requested_by_header(tmp_path):
+    """Test X-Profile: 1 writes a profile of the request and names it in the response"""
+    app = FastAPI()
+    
+    @app.get("/slow")
+    async def slow():
+        blocking_handler()
+        return {}
+    
+    app.add_middleware(ProfilingMiddleware, header_enabled=True, directory=str(tmp_path), interval_ms=5)
+    client = TestClient(app)
+    assert "X-Profile-File" not in client.get("/slow").headers
+    filename = client.get("/slow", headers={"X-Profile": "1"}).headers["X-Profile-File"]
+    
+    path = tmp_path / filename
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    lines = path.read_text().splitlines()
+    assert any("blocking_handler (test_profiling.py:" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+def test_profile_follows_sync_handlers(tmp_path):
+    """Test the profile includes handlers running on the thread pool"""
+    app = FastAPI()
+    
+    @app.get("/slow")
+    def slow():
+        blocking_handler()
+        return {}
+    
+    app.add_middleware(ProfilingMiddleware, header_enabled=True, directory=str(tmp_path), interval_ms=5)
+    client = TestClient(app)
+    filename = client.get("/slow", headers={"X-Profile": "1"}).headers["X-Profile-File"]
+    
+    path = tmp_path / filename
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert any("blocking_handler (test_profiling.py:" in line for line in path.read_text().splitlines())
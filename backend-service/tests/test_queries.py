@@ -0,0 +1,36 @@
+"""
+Tests for the shared hot-path statements
+"""
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.database import Base
+from app.models import Task, User
+from app.queries import delete_user_task_tree, user_by_username, user_task, user_task_exists
+
+def test_lookups_are_scoped_to_owner(db, seed, test_user):
+    """Test the task lookups only see the user's own tasks"""
+    task_id = seed.tasks(test_user["id"], 1)[0]
+    other_id = seed.users(1, prefix="other")[0]
+    assert user_by_username(db, "testuser").id == test_user["id"]
+    assert user_by_username(db, "nobody") is None
+    assert user_task(db, task_id, test_user["id"]).id == task_id
+    assert user_task(db, task_id, other_id) is None
+    assert user_task_exists(db, task_id, test_user["id"])
+    assert not user_task_exists(db, task_id, other_id)
+    assert delete_user_task_tree(db, task_id, other_id) == []
+    assert [row.id for row in delete_user_task_tree(db, task_id, test_user["id"])] == [task_id]
+
+def test_statements_compile_once():
+    """Test repeated lookups with new values reuse one compiled statement"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add(User(id=1, username="a", email="a@example.com", hashed_password="x"))
+        db.add(Task(id=1, title="t", assigned_user_id=1))
+        db.commit()
+        user_task(db, 1, 1)
+        compiled = len(engine._compiled_cache)
+        for task_id in range(2, 10):
+            user_task(db, task_id, 1)
+            user_task(db, 1, task_id)
+        assert len(engine._compiled_cache) == compiled
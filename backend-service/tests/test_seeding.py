@@ -0,0 +1,69 @@
+"""
+Tests for the synthetic data generator
+"""
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.auth import verify_password
+from app.models import Task, TaskStatus, User, UserDirectory
+from app.seeding import seed_database
+from app.sync import current_change_seq
+
+AS_OF = datetime(2026, 1, 1)
+
+def task_snapshot(engine):
+    """Every seeded task's generated fields, in id order"""
+    with Session(engine) as db:
+        return db.execute(
+            select(Task.title, Task.status, Task.priority, Task.assigned_user_id, Task.created_at, Task.completed_at)
+            .order_by(Task.id)
+        ).all()
+
+def test_seed_is_deterministic(file_shards):
+    """Test the same seed generates the same data and a different seed different data"""
+    first, second = file_shards("a"), file_shards("b")
+    for shards in (first, second):
+        seed_database(shards, users=20, tasks=500, seed=7, as_of=AS_OF, chunk_size=128)
+    assert task_snapshot(first.engines[0]) == task_snapshot(second.engines[0])
+
+    other = file_shards("c")
+    seed_database(other, users=20, tasks=500, seed=8, as_of=AS_OF)
+    assert task_snapshot(other.engines[0]) != task_snapshot(first.engines[0])
+
+def test_seeded_rows_are_realistic(file_shards):
+    """Test seeded users can log in and tasks have consistent statuses, dates and change sequence"""
+    shards = file_shards("db")
+    result = seed_database(shards, users=50, tasks=2000, seed=1, as_of=AS_OF, password="secret1")
+    assert result == {"users": 50, "tasks": 2000, "first_user_id": 1}
+
+    with Session(shards.engines[0]) as db:
+        user = db.get(User, 1)
+        assert verify_password("secret1", user.hashed_password)
+        tasks = db.scalars(select(Task)).all()
+        assert current_change_seq(db) == 2000
+
+    assert sorted(task.change_seq for task in tasks) == list(range(1, 2001))
+    assert all(task.created_at <= AS_OF for task in tasks)
+    completed = [task for task in tasks if task.status == TaskStatus.COMPLETED]
+    assert all(task.created_at <= task.completed_at <= AS_OF for task in completed)
+    assert all(task.completed_at is None for task in tasks if task.status != TaskStatus.COMPLETED)
+    assert len(completed) > len(tasks) / 2
+    assert len({task.status for task in tasks}) == 3
+
+def test_seed_routes_to_home_shards(file_shards):
+    """Test seeded users and tasks land on their home shards and a rerun continues the ids"""
+    shards = file_shards("shard", count=2)
+    seed_database(shards, users=10, tasks=300, seed=3, as_of=AS_OF)
+
+    with Session(shards.engines[0]) as db:
+        assert db.scalar(select(func.count(UserDirectory.id))) == 10
+    for shard_id, engine in enumerate(shards.engines):
+        with Session(engine) as db:
+            user_ids = db.scalars(select(User.id)).all()
+            owners = db.scalars(select(Task.assigned_user_id).distinct()).all()
+        assert user_ids
+        assert all(shards.shard_for_user(user_id) == shard_id for user_id in user_ids)
+        assert set(owners) <= set(user_ids)
+
+    # A second run continues after the ids already handed out
+    assert seed_database(shards, users=5, tasks=0, as_of=AS_OF)["first_user_id"] == 11
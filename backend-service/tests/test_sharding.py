@@ -0,0 +1,157 @@
+"""
+Tests for sharding users across databases
+"""
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+from app.main import app
+from app.audit import audit_log
+from app.database import RoutingSession, ShardMap, get_db
+from app import sharding
+from app.models import Tag, Task, TaskClosure, User, UserDirectory
+from app.sharding import move_user, rebalance
+
+def use_shards(shard_map):
+    """Point the app's session dependency and audit writer at shard_map; session_factory restores both"""
+    factory = sessionmaker(class_=RoutingSession, shard_map=shard_map, autocommit=False, autoflush=False)
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_get_db
+    audit_log.session_factory = factory
+
+def add_shard(shard_map, extra):
+    """shard_map with the shards of extra appended"""
+    return ShardMap(shard_map.urls + extra.urls, shard_map.engines + extra.engines, shard_map.readers + extra.readers)
+
+@pytest.fixture
+def shards(session_factory, file_shards):
+    """Two SQLite shards behind the API"""
+    shard_map = file_shards("shard", count=2)
+    use_shards(shard_map)
+    return shard_map
+
+def signup_and_login(client, name):
+    """Create a user and return their auth headers"""
+    response = client.post("/api/auth/signup", json={
+        "username": name, "email": f"{name}@example.com", "password": "testpassword"
+    })
+    assert response.status_code == 200
+    response = client.post("/api/auth/login", json={"username": name, "password": "testpassword"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def count_rows(engine, model, **filters):
+    """Rows of model on one database matching filters"""
+    with Session(engine) as db:
+        return db.scalar(select(func.count()).select_from(model).filter_by(**filters))
+
+def test_users_routed_to_home_shard(client, shards):
+    """Test signups and task writes land on the user's home shard and reads find them there"""
+    names = ["alice", "bob", "carol", "dave"]
+    headers = {name: signup_and_login(client, name) for name in names}
+    for name in names:
+        response = client.post("/api/tasks", json={"title": f"{name}'s task"}, headers=headers[name])
+        assert response.status_code == 200
+
+    # Ids come from the directory on the first shard; crc32 puts 1-3 on shard 1, 4 on shard 0
+    assert count_rows(shards.engines[0], UserDirectory) == 4
+    assert count_rows(shards.engines[1], User) == 3
+    assert count_rows(shards.engines[0], User) == 1
+    assert count_rows(shards.engines[0], Task, assigned_user_id=4) == 1
+    assert count_rows(shards.engines[1], Task) == 3
+
+    for name in names:
+        me = client.get("/api/users/me", headers=headers[name]).json()
+        assert me["username"] == name
+        tasks = client.get("/api/tasks", headers=headers[name]).json()["tasks"]
+        assert [task["title"] for task in tasks] == [f"{name}'s task"]
+
+def test_duplicate_signup_rejected_across_shards(client, shards):
+    """Test the user directory rejects an email already taken on another shard"""
+    signup_and_login(client, "alice")
+    response = client.post("/api/auth/signup", json={
+        "username": "other", "email": "alice@example.com", "password": "testpassword"
+    })
+    assert response.status_code == 400
+    assert count_rows(shards.engines[0], UserDirectory) == 1
+
+def test_rebalance_moves_user_and_forces_resync(client, shards, file_shards):
+    """Test rebalancing moves a user's tasks, subtasks and tags and sends their clients a full resync"""
+    headers = signup_and_login(client, "alice")
+    first = client.post("/api/tasks", json={"title": "first"}, headers=headers).json()["id"]
+    client.post("/api/tasks", json={"title": "second", "parent_id": first}, headers=headers)
+    client.post("/api/tags/apply", json={"task_ids": [first], "tags": ["urgent"]}, headers=headers)
+    cursor = client.get("/api/tasks/changes", headers=headers).json()["cursor"]
+
+    # Adding a third shard moves user 1 from shard 1 to shard 2
+    grown = add_shard(shards, file_shards("added"))
+    assert rebalance(shards, grown, dry_run=True) == {1: 0}
+    assert count_rows(shards.engines[1], Task) == 2
+    assert rebalance(shards, grown, batch_size=1) == {1: 2}
+    assert count_rows(shards.engines[1], Task) == 0
+    assert count_rows(grown.engines[2], Task) == 2
+
+    use_shards(grown)
+    tasks = client.get("/api/tasks", headers=headers).json()["tasks"]
+    assert sorted(task["title"] for task in tasks) == ["first", "second"]
+    root = next(task["id"] for task in tasks if task["title"] == "first")
+    tree = client.get(f"/api/tasks/{root}/subtree", headers=headers).json()["tasks"]
+    assert [(task["title"], task["depth"]) for task in tree] == [("first", 0), ("second", 1)]
+    assert client.get("/api/tasks?tags=urgent", headers=headers).json()["total"] == 1
+    assert client.get("/api/tags", headers=headers).json()["tags"] == [{"name": "urgent", "task_count": 1}]
+    assert count_rows(shards.engines[1], Tag) == 0
+    changes = client.get("/api/tasks/changes", params={"since": cursor}, headers=headers).json()
+    assert changes["full_resync"] is True
+    changes = client.get("/api/tasks/changes", params={"since": changes["cursor"]}, headers=headers).json()
+    assert changes["full_resync"] is False
+
+def test_interrupted_move_can_be_rerun(client, shards, file_shards, monkeypatch):
+    """Test a move that fails after copying can be run again without duplicating rows"""
+    headers = signup_and_login(client, "alice")
+    first = client.post("/api/tasks", json={"title": "first"}, headers=headers).json()["id"]
+    client.post("/api/tasks", json={"title": "second", "parent_id": first}, headers=headers)
+    target = file_shards("target").engines[0]
+
+    # Fail after the copy has committed on the target, before the source is cleared
+    delete_user_data = sharding._delete_user_data
+    def interrupted(db, user_id):
+        if db.get_bind() is shards.engines[1]:
+            raise RuntimeError("interrupted")
+        delete_user_data(db, user_id)
+    monkeypatch.setattr(sharding, "_delete_user_data", interrupted)
+    with pytest.raises(RuntimeError):
+        move_user(1, shards.engines[1], target, batch_size=1)
+    assert count_rows(target, Task) == 2
+    assert count_rows(shards.engines[1], Task) == 2
+
+    monkeypatch.setattr(sharding, "_delete_user_data", delete_user_data)
+    assert move_user(1, shards.engines[1], target, batch_size=1) == 2
+    assert count_rows(shards.engines[1], Task) == 0
+    assert count_rows(target, Task) == 2
+    assert count_rows(target, User) == 1
+    assert count_rows(target, TaskClosure) == 1
+    with Session(target) as db:
+        parent_ids = db.execute(select(Task.title, Task.parent_id).order_by(Task.id)).all()
+        root = db.scalar(select(Task.id).where(Task.title == "first"))
+    assert parent_ids == [("first", None), ("second", root)]
+
+def test_rebalance_backfills_user_directory(client, file_shards):
+    """Test going from one database to shards fills the user directory for existing users"""
+    single = file_shards("single")
+    use_shards(single)
+    for name in ["alice", "bob", "carol", "dave"]:
+        signup_and_login(client, name)
+    assert count_rows(single.engines[0], UserDirectory) == 0
+
+    sharded = add_shard(single, file_shards("added"))
+    assert rebalance(single, sharded) == {1: 0, 2: 0, 3: 0}
+    assert count_rows(single.engines[0], UserDirectory) == 4
+
+    # New signups get ids after the existing users
+    use_shards(sharded)
+    signup_and_login(client, "erin")
+    assert count_rows(single.engines[0], UserDirectory, username="erin", id=5) == 1